@@ -0,0 +1,236 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import threading
+import http.client
+from pathlib import Path
+from queue import Queue, Empty
+from time import perf_counter, sleep
+from urllib.parse import urlsplit
+
+# 确保脚本在正确的目录下运行
+SCRIPT_DIR = Path(__file__).resolve().parent
+os.chdir(SCRIPT_DIR)
+sys.path.insert(0, str(SCRIPT_DIR / "server"))
+
+USER_DATA_DIR = "data/user"
+
+
+def load_trace(path):
+    """
+    读取请求记录（JSONL），每行形如 {"method": "POST", "path": "/account/syncData", "body": {...}, "headers": {...}}。
+    没有 path 的行（例如其他用途的 JSONL）会被跳过
+    """
+    requests = []
+    skipped = 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if not isinstance(item, dict) or not isinstance(item.get("path"), str):
+                skipped += 1
+                continue
+            body = item.get("body")
+            if body is None:
+                data = b""
+            elif isinstance(body, str):
+                data = body.encode()
+            else:
+                data = json.dumps(body).encode()
+            headers = {"Content-Type": "application/json"}
+            headers.update(item.get("headers") or {})
+            requests.append((item.get("method", "POST").upper(), item["path"], data, headers))
+    return requests, skipped
+
+
+class LocalTarget:
+    """通过 Flask 测试客户端在当前进程内发送请求"""
+
+    def __init__(self):
+        from app import app, load_tables, start_background_tasks
+        load_tables()
+        start_background_tasks()
+        self.app = app
+
+    def client(self):
+        test_client = self.app.test_client()
+
+        def send(method, path, data, headers):
+            response = test_client.open(path, method=method, data=data, headers=headers)
+            response.close()
+            return response.status_code
+        return send
+
+    def metrics(self):
+        from metrics import metrics
+        return metrics.render()
+
+
+class HttpTarget:
+    """向运行中的服务端发送请求"""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+
+    def client(self):
+        connection = [http.client.HTTPConnection(self.host, self.port, timeout=60)]
+
+        def send(method, path, data, headers):
+            try:
+                connection[0].request(method, path, body=data, headers=headers)
+                response = connection[0].getresponse()
+                response.read()
+                return response.status
+            except (OSError, http.client.HTTPException):
+                connection[0].close()
+                connection[0] = http.client.HTTPConnection(self.host, self.port, timeout=60)
+                return 0
+        return send
+
+    def metrics(self):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=10)
+        try:
+            connection.request("GET", "/metrics")
+            response = connection.getresponse()
+            return response.read().decode() if response.status == 200 else ""
+        except OSError:
+            return ""
+        finally:
+            connection.close()
+
+
+def written_bytes(metrics_text):
+    """从 /metrics 的输出中累加写入磁盘的字节数（write_json、玩家数据日志与寻访记录日志）"""
+    total = 0
+    for line in metrics_text.splitlines():
+        if line.startswith("doctorate_json_write_bytes_total"):
+            total += int(float(line.rsplit(" ", 1)[1]))
+    return total
+
+
+def percentile(values, p):
+    # 最近秩法
+    if not values:
+        return 0.0
+    index = max(int(round(p / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def replay(target, requests, concurrency, rate):
+    """
+    按顺序把请求分配给 concurrency 个线程发送，rate 大于0时限制总的请求速率（次/秒）
+
+    :return: ([(path, 耗时, 状态码)], 总耗时)
+    """
+    queue = Queue()
+    for index, request in enumerate(requests):
+        queue.put((index, request))
+    results = []
+    lock = threading.Lock()
+    start = perf_counter()
+
+    def worker():
+        send = target.client()
+        while True:
+            try:
+                index, (method, path, data, headers) = queue.get_nowait()
+            except Empty:
+                return
+            if rate > 0:
+                delay = start + index / rate - perf_counter()
+                if delay > 0:
+                    sleep(delay)
+            begin = perf_counter()
+            status = send(method, path, data, headers)
+            elapsed = perf_counter() - begin
+            with lock:
+                results.append((path.split("?", 1)[0], elapsed, status))
+
+    threads = [threading.Thread(target=worker) for _ in range(max(concurrency, 1))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, perf_counter() - start
+
+
+def report(results, elapsed, disk_bytes):
+    routes = {}
+    for path, latency, status in results:
+        routes.setdefault(path, []).append((latency, status))
+
+    print(f"{'route':<48}{'count':>7}{'errors':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    rows = []
+    for path, items in routes.items():
+        latencies = sorted(latency for latency, _ in items)
+        errors = sum(1 for _, status in items if status == 0 or status >= 500)
+        rows.append((path, len(items), errors, *(percentile(latencies, p) * 1000 for p in (50, 95, 99))))
+    rows.sort(key=lambda row: row[1] * row[3], reverse=True)
+    for path, count, errors, p50, p95, p99 in rows:
+        print(f"{path:<48}{count:>7}{errors:>8}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}")
+
+    latencies = sorted(latency for _, latency, _ in results)
+    print(f"共 {len(results)} 个请求，耗时 {elapsed:.3f}s，吞吐量 {len(results) / elapsed if elapsed else 0:.1f} 次/秒，"
+          f"p50 {percentile(latencies, 50) * 1000:.2f}ms，p95 {percentile(latencies, 95) * 1000:.2f}ms，"
+          f"p99 {percentile(latencies, 99) * 1000:.2f}ms")
+    if disk_bytes is None:
+        print("写入磁盘: 未知（无法读取 /metrics）")
+    else:
+        print(f"写入磁盘: {disk_bytes / 1048576:.2f}MB（write_json 与日志追加）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按请求记录回放请求并统计各接口的耗时")
+    parser.add_argument("trace", help="请求记录文件（JSONL）")
+    parser.add_argument("--url", help="服务端地址，如 http://127.0.0.1:8443；不指定时在当前进程内通过测试客户端请求")
+    parser.add_argument("-c", "--concurrency", type=int, default=1, help="并发数，默认为1")
+    parser.add_argument("-r", "--rate", type=float, default=0, help="总请求速率（次/秒），默认为0（不限制）")
+    parser.add_argument("-n", "--repeat", type=int, default=1, help="重复回放的次数，默认为1")
+    parser.add_argument("--restore", action="store_true", help=f"结束后恢复 {USER_DATA_DIR} 目录（回放会修改玩家数据）")
+    args = parser.parse_args()
+
+    requests, skipped = load_trace(args.trace)
+    if skipped:
+        print(f"跳过 {skipped} 行不是请求记录的数据")
+    if not requests:
+        print("错误：请求记录中没有可回放的请求")
+        sys.exit(1)
+    requests = requests * max(args.repeat, 1)
+
+    backup = None
+    if args.restore:
+        backup = os.path.join(tempfile.mkdtemp(), "user")
+        shutil.copytree(USER_DATA_DIR, backup)
+
+    try:
+        target = HttpTarget(args.url) if args.url else LocalTarget()
+        before = target.metrics()
+        results, elapsed = replay(target, requests, args.concurrency, args.rate)
+        if not args.url:
+            # 进程内回放时先把 PlayerStore 中的数据写回，计入写入磁盘的字节数，也避免退出时覆盖恢复的文件
+            from utils import player_store
+            player_store.close()
+        after = target.metrics()
+        disk_bytes = written_bytes(after) - written_bytes(before) if after else None
+        report(results, elapsed, disk_bytes)
+    finally:
+        if backup is not None:
+            shutil.rmtree(USER_DATA_DIR)
+            shutil.copytree(backup, USER_DATA_DIR)
+            shutil.rmtree(os.path.dirname(backup))
+            print(f"已恢复 {USER_DATA_DIR}")
+
+
+if __name__ == "__main__":
+    main()
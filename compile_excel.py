@@ -0,0 +1,54 @@
+import os
+import sys
+from pathlib import Path
+from time import perf_counter
+
+# 确保脚本在正确的目录下运行
+SCRIPT_DIR = Path(__file__).resolve().parent
+os.chdir(SCRIPT_DIR)
+sys.path.insert(0, str(SCRIPT_DIR / "server"))
+
+from tablecache import load_table, read_cache, cache_path
+
+EXCEL_DIR = "data/excel"
+
+
+def compile_tables():
+    """为 data/excel 下的全部表生成二进制缓存，并对比 JSON 与缓存的加载耗时"""
+    if not os.path.isdir(EXCEL_DIR):
+        print(f"错误：未找到目录 {EXCEL_DIR}")
+        sys.exit(1)
+
+    rows = []
+    for filename in sorted(os.listdir(EXCEL_DIR)):
+        if not filename.endswith(".json"):
+            continue
+        path = os.path.join(EXCEL_DIR, filename)
+
+        start = perf_counter()
+        load_table(path, use_cache=False)
+        json_time = perf_counter() - start
+
+        # 缓存不存在或已过期时会在这里重新生成
+        load_table(path)
+
+        start = perf_counter()
+        data, _ = read_cache(path)
+        cache_time = perf_counter() - start
+        if data is None:
+            print(f"警告：{filename} 的缓存生成失败")
+            continue
+
+        rows.append((filename[:-5], os.path.getsize(path), os.path.getsize(cache_path(path)), json_time, cache_time))
+
+    rows.sort(key=lambda row: row[3], reverse=True)
+    print(f"{'表名':<40}{'JSON大小':>12}{'缓存大小':>12}{'JSON耗时':>12}{'缓存耗时':>12}")
+    for name, json_size, cache_size, json_time, cache_time in rows:
+        print(f"{name:<40}{json_size:>12}{cache_size:>12}{json_time:>12.4f}{cache_time:>12.4f}")
+    total_json = sum(row[3] for row in rows)
+    total_cache = sum(row[4] for row in rows)
+    print(f"共 {len(rows)} 个表，JSON总耗时 {total_json:.3f}s，缓存总耗时 {total_cache:.3f}s")
+
+
+if __name__ == "__main__":
+    compile_tables()
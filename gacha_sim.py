@@ -0,0 +1,195 @@
+import os
+import sys
+import random
+import argparse
+from pathlib import Path
+from time import perf_counter
+
+# 确保脚本在正确的目录下运行
+SCRIPT_DIR = Path(__file__).resolve().parent
+os.chdir(SCRIPT_DIR)
+sys.path.insert(0, str(SCRIPT_DIR / "server"))
+
+# 公开招募的卡池文件，没有保底且不计算 UP 角色
+NORMAL_POOL_ID = "normalGacha"
+# 6★ 的 rarityRank
+SIX_STAR = 5
+
+
+def compile_pool(pool_id, six_star_only):
+    """按服务端寻访时的参数编译卡池，返回 (编译后的卡池, 是否有保底)"""
+    from gachapool import pool_registry
+    from gachaengine import get_compiled_pool
+
+    entry = pool_registry.get(pool_id)
+    if entry is None:
+        raise SystemExit(f"错误：未找到卡池 {pool_id}")
+    if pool_id == NORMAL_POOL_ID:
+        return get_compiled_pool(entry.path, 100, False, six_star_only, entry.pool), False
+    return get_compiled_pool(entry.path, 200, not pool_id.startswith("BOOT"), six_star_only, entry.pool), True
+
+
+class VectorSampler:
+    """
+    把编译后的卡池转换为 NumPy 数组，成批抽样。
+    稀有度的别名表按保底等级（本次是上次 6★ 之后的第几抽 // 50）分别构建，与 CompiledPool.rank_table 使用相同的权重
+    """
+
+    def __init__(self, np, pool, pity):
+        self.np = np
+        self.pool = pool
+        self.pity = pity
+        self.rank_items = pool.rank_table(0).items
+        self.rank_rarity = np.array([rarity_rank for rarity_rank, _ in self.rank_items])
+        self.rank_probs = []
+        self.rank_aliases = []
+        self.chars = {}
+        for rank, (_, index) in enumerate(self.rank_items):
+            table = pool.char_tables.get(index)
+            if table is not None:
+                self.chars[rank] = (table.items, np.array(table.prob), np.array(table.alias))
+
+    def _ensure_levels(self, levels):
+        from gachaengine import six_star_bonus
+
+        while len(self.rank_probs) < levels:
+            bonus = six_star_bonus(len(self.rank_probs) * 50) if self.pity else 0
+            table = self.pool.rank_table(bonus)
+            self.rank_probs.append(table.prob)
+            self.rank_aliases.append(table.alias)
+        return self.np.array(self.rank_probs), self.np.array(self.rank_aliases)
+
+    def sample_alias(self, rng, prob, alias, size):
+        np = self.np
+        i = (rng.random(size) * prob.shape[-1]).astype(np.int64)
+        return np.where(rng.random(size) < prob[i], i, alias[i])
+
+    def run(self, rng, players, pulls, start_count=0):
+        """
+        模拟 players 名玩家各抽 pulls 次，每一步同时为所有玩家抽一次
+
+        :return: (每个稀有度位置的次数, {稀有度位置: 每个角色的次数}, 每名玩家第一次获得 6★ 的抽数（未获得为0）)
+        """
+        np = self.np
+        counts = np.full(players, start_count, dtype=np.int64)
+        first_six = np.zeros(players, dtype=np.int64)
+        rank_hits = np.zeros(len(self.rank_items), dtype=np.int64)
+        char_hits = {rank: np.zeros(len(items), dtype=np.int64) for rank, (items, _, _) in self.chars.items()}
+        for step in range(1, pulls + 1):
+            # 与 gacha.Gacha 相同：先增加抽卡次数，再按增加后的次数计算保底
+            counts += 1
+            levels = counts // 50 if self.pity else np.zeros(players, dtype=np.int64)
+            probs, aliases = self._ensure_levels(int(levels.max()) + 1)
+            i = (rng.random(players) * probs.shape[1]).astype(np.int64)
+            ranks = np.where(rng.random(players) < probs[levels, i], i, aliases[levels, i])
+            rank_hits += np.bincount(ranks, minlength=len(self.rank_items))
+            for rank, (items, prob, alias) in self.chars.items():
+                n = int(np.count_nonzero(ranks == rank))
+                if n:
+                    char_hits[rank] += np.bincount(self.sample_alias(rng, prob, alias, n), minlength=len(items))
+            six = self.rank_rarity[ranks] == SIX_STAR
+            first_six[six & (first_six == 0)] = step
+            counts[six] = 0
+        return rank_hits, char_hits, first_six
+
+
+def expected_char_share(table):
+    """同一稀有度位置内每个角色的理论占比"""
+    total = float(sum(table.weights))
+    return [weight / total for weight in table.weights]
+
+
+def report(sampler, rank_hits, char_hits, first_six, pulls, elapsed, top):
+    np = sampler.np
+    total = int(rank_hits.sum())
+    print(f"模拟 {total} 抽，耗时 {elapsed:.2f}s，{total / elapsed:,.0f} 抽/秒")
+
+    print("\n稀有度:")
+    base = sampler.pool.rank_table(0)
+    base_total = float(sum(base.weights))
+    for rank, (rarity_rank, _) in enumerate(sampler.rank_items):
+        print(f"  {rarity_rank + 1}★  {rank_hits[rank] / total:8.4%}  (不计保底 {base.weights[rank] / base_total:.4%})")
+
+    print(f"\n角色（每个稀有度最多 {top} 个）:")
+    for rank, (rarity_rank, index) in enumerate(sampler.rank_items):
+        hits = char_hits.get(rank)
+        rank_total = int(hits.sum()) if hits is not None else 0
+        if not rank_total:
+            continue
+        table = sampler.pool.char_tables[index]
+        shares = expected_char_share(table)
+        deviation = max(abs(hits[i] / rank_total - share) for i, share in enumerate(shares))
+        print(f"  {rarity_rank + 1}★ 共 {len(shares)} 个，与理论占比的最大偏差 {deviation:.4%}")
+        for i in np.argsort(-hits)[:top]:
+            print(f"    {table.items[i]:<24} {hits[i] / total:8.4%}  稀有度内 {hits[i] / rank_total:8.4%}  (理论 {shares[i]:.4%})")
+
+    got = first_six[first_six > 0]
+    print("\n第一次获得 6★ 的抽数:")
+    if not len(got):
+        print(f"  {pulls} 抽内均未获得 6★")
+        return
+    p50, p90, p99 = np.percentile(got, [50, 90, 99])
+    print(f"  平均 {got.mean():.2f}  p50 {p50:.0f}  p90 {p90:.0f}  p99 {p99:.0f}  最大 {got.max()}")
+    print(f"  {len(first_six) - len(got)} / {len(first_six)} 名玩家在 {pulls} 抽内未获得 6★")
+    histogram = np.bincount((got - 1) // 10)
+    for bucket, count in enumerate(histogram):
+        if count:
+            print(f"  {bucket * 10 + 1:>4}-{bucket * 10 + 10:<4} {count / len(first_six):8.4%}")
+
+
+def engine_benchmark(pool, pity, draws, seed):
+    """逐次调用服务端的 CompiledPool.draw，测量抽卡引擎的吞吐量"""
+    from gachaengine import six_star_bonus
+
+    rng = random.Random(seed)
+    count = 0
+    six_stars = 0
+    start = perf_counter()
+    for _ in range(draws):
+        count += 1
+        rarity_rank, _, _ = pool.draw(six_star_bonus(count) if pity else 0, rng)
+        if rarity_rank == SIX_STAR:
+            count = 0
+            six_stars += 1
+    elapsed = perf_counter() - start
+    print(f"\n抽卡引擎（CompiledPool.draw）: {draws} 抽，耗时 {elapsed:.2f}s，{draws / elapsed:,.0f} 抽/秒，"
+          f"6★ {six_stars / draws:.4%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="寻访概率的蒙特卡洛模拟，使用服务端的卡池编译逻辑")
+    parser.add_argument("pool", help=f"卡池ID（data/gacha 下的文件名），{NORMAL_POOL_ID} 为公开招募")
+    parser.add_argument("-p", "--players", type=int, default=10000, help="同时模拟的玩家数，默认为10000")
+    parser.add_argument("-n", "--pulls", type=int, default=100, help="每名玩家的抽数，默认为100")
+    parser.add_argument("--start-count", type=int, default=0, help="开始时距离上次 6★ 的次数，默认为0")
+    parser.add_argument("--six-star-only", action=argparse.BooleanOptionalAction, default=None,
+                        help="是否只出 6★，默认读取 config.json 中 gacha 的 sixStarOnly")
+    parser.add_argument("--seed", type=int, default=None, help="随机数种子")
+    parser.add_argument("--top", type=int, default=10, help="每个稀有度输出的角色数，默认为10")
+    parser.add_argument("--engine-draws", type=int, default=200000,
+                        help="抽卡引擎吞吐量测试的抽数，默认为200000，0为不测试")
+    args = parser.parse_args()
+
+    if args.six_star_only is None:
+        from configstore import config_store
+        args.six_star_only = config_store.six_star_only()
+    pool, pity = compile_pool(args.pool, args.six_star_only)
+    print(f"卡池 {args.pool}，sixStarOnly={args.six_star_only}，{'有' if pity else '无'}保底")
+
+    try:
+        import numpy as np
+    except ImportError:
+        print("未安装 numpy（pip install numpy），跳过模拟")
+    else:
+        sampler = VectorSampler(np, pool, pity)
+        rng = np.random.default_rng(args.seed)
+        start = perf_counter()
+        rank_hits, char_hits, first_six = sampler.run(rng, args.players, args.pulls, args.start_count)
+        report(sampler, rank_hits, char_hits, first_six, args.pulls, perf_counter() - start, args.top)
+
+    if args.engine_draws > 0:
+        engine_benchmark(pool, pity, args.engine_draws, args.seed)
+
+
+if __name__ == "__main__":
+    main()
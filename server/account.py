@@ -2,23 +2,472 @@ import json
 import uuid
 from base64 import b64encode
 from copy import deepcopy
-from datetime import datetime
 from hashlib import md5
+import os
 from os.path import exists
 
-from flask import request
+from flask import request, Response, g
+from msgspec import Raw
 
 from constants import (
     USER_JSON_PATH,
-    CONFIG_PATH,
     BATTLE_REPLAY_JSON_PATH,
     SYNC_DATA_TEMPLATE_PATH,
     CRISIS_V2_JSON_BASE_PATH,
     MAILLIST_PATH,
     SQUADS_PATH
 )
-from utils import read_json, write_json, get_memory, run_after_response, update_check_in_status
+from utils import read_json, write_json, get_memory, run_after_response, update_check_in_status, \
+    json_encoder, json_decoder, table_version, get_data_version, player_store
+from configstore import config_store
+from tableindex import get_index, register_index, index_version, prefetch_indexes
+from responsecache import response_cache
 from virtualtime import time
+from profiler import Profile
+
+
+def sync_section(name: str):
+    '''
+    取出由表派生的 syncData 片段。片段按表版本缓存为编码后的 JSON，每次解码得到新的对象，可以直接写入玩家数据
+
+    :param name: 片段名，如"syncData.stages"
+    '''
+    return json_decoder.decode(get_index(name))
+
+
+def put_section(doc, fragments, name: str, *path: str):
+    '''
+    把 syncData 片段解码后写入 doc 的 path 处，同时记录编码后的片段，返回响应时直接拼接，不再重新序列化
+
+    :param doc: 玩家数据
+    :param fragments: 路径 -> 编码后的片段
+    :param name: 片段名
+    :param path: 片段在 doc 中的路径
+    '''
+    encoded = get_index(name)
+    target = doc
+    for key in path[:-1]:
+        target = target[key]
+    target[path[-1]] = value = json_decoder.decode(encoded)
+    fragments[path] = encoded
+    return value
+
+
+def encode_with_fragments(doc, fragments) -> bytes:
+    '''
+    编码 doc，fragments 中记录的路径使用预先编码的片段（msgspec Raw）。
+    只复制路径上的字典，doc 本身不会被修改
+
+    :param fragments: 路径 -> 编码后的片段或 Raw
+    '''
+    doc = dict(doc)
+    for path, encoded in fragments.items():
+        target = doc
+        for key in path[:-1]:
+            target[key] = target = dict(target[key])
+        target[path[-1]] = encoded if isinstance(encoded, Raw) else Raw(encoded)
+    return json_encoder.encode(doc)
+
+
+@register_index("syncData.flags", "story_table")
+def _sync_flags(story_table):
+    flags = {"init": 1}
+    for story in story_table:
+        flags[story] = 1
+    return json_encoder.encode(flags)
+
+
+@register_index("syncData.stages", "stage_table")
+def _sync_stages(stage_table):
+    return json_encoder.encode(_stage_states(stage_table))
+
+
+@register_index("syncData.stageFragments", "stage_table")
+def _sync_stage_fragments(stage_table):
+    # 每个关卡单独编码，部分关卡有战斗回放时只重新编码这些关卡
+    return {stage: Raw(json_encoder.encode(state)) for stage, state in _stage_states(stage_table).items()}
+
+
+def _stage_states(stage_table):
+    return {
+        stage: {
+            "completeTimes": 1,
+            "hasBattleReplay": 0,
+            "noCostCnt": 0,
+            "practiceTimes": 0,
+            "stageId": stage_data["stageId"],
+            "startTimes": 1,
+            "state": 3
+        } for stage, stage_data in stage_table["stages"].items()
+    }
+
+
+@register_index("syncData.addon", "handbook_info_table")
+def _sync_addon(addon_table):
+    # 悖论模拟与干员密录
+    addonList = {}
+    for charId in addon_table["handbookDict"]:
+        addonList[charId] = {"story": {}}
+        for story in addon_table["handbookDict"][charId]["handbookAvgList"]:
+            if "storySetId" in story:
+                addonList[charId]["story"][story["storySetId"]] = {
+                    "fts": 1649232340,
+                    "rts": 1649232340
+                }
+
+    for stage in addon_table["handbookStageData"]:
+        addonList[stage].update({
+            "stage": {
+                addon_table["handbookStageData"][stage]["stageId"]: {
+                    "startTimes": 0,
+                    "completeTimes": 1,
+                    "state": 3,
+                    "fts": 1624284657,
+                    "rts": 1624284657,
+                    "startTime": 2
+                }
+            }
+        })
+    return json_encoder.encode(addonList)
+
+
+@register_index("syncData.retro", "retro_table")
+def _sync_retro(retro_table):
+    # 插曲与别传
+    block = {retro: {"locked": 0, "open": 1} for retro in retro_table["retroActList"]}
+
+    trail = {}
+    for retro in retro_table["retroTrailList"]:
+        trail[retro] = {}
+        for trailReward in retro_table["retroTrailList"][retro]["trailRewardList"]:
+            trail[retro] = {trailReward["trailRewardId"]: 1}
+    return json_encoder.encode({"block": block, "trail": trail})
+
+
+@register_index("syncData.display", "display_meta_table")
+def _sync_display(display_meta_table):
+    # 名片皮肤、头像、背景与主题，头像与背景的时间戳在同步时填入
+    home_bg_data = display_meta_table["homeBackgroundData"]
+    themes = None
+    if "themeList" in home_bg_data:
+        themes = {theme["id"]: {"unlock": 1691670000} for theme in home_bg_data["themeList"]}
+    return json_encoder.encode({
+        "nameCardSkins": list(display_meta_table["nameCardV2Data"]["skinData"]),
+        "avatars": [
+            [avatar["avatarId"], "initial" if avatar["avatarId"].startswith("avatar_def") else "other"]
+            for avatar in display_meta_table["playerAvatarData"]["avatarList"]
+        ],
+        "bgs": [bg["bgId"] for bg in home_bg_data["homeBgDataList"]],
+        "themes": themes
+    })
+
+
+@register_index("syncData.charms", "charm_table")
+def _sync_charms(charm_table):
+    try:
+        charms = {charm["id"]: 1 for charm in charm_table["charmList"]}
+    except TypeError:
+        charms = {charm["id"]: 1 for charm in charm_table}
+    return json_encoder.encode(charms)
+
+
+@register_index("syncData.activity", "activity_table")
+def _sync_activity(activity_table):
+    # battle bus、愚人号（act17side）以及全部活动id
+    car = {}
+    if "carData" in activity_table:
+        for car_gear, car_data in activity_table["carData"]["carDict"].items():
+            car[car_gear] = {"id": car_gear, "num": len(car_data["posList"])}
+
+    activity_data = activity_table["activity"]["TYPE_ACT17SIDE"]["act17side"]
+    logs = {}
+    for log in activity_data["archiveItemUnlockDataMap"]:
+        if not log.startswith("act17side_log_"):
+            continue
+        logs.setdefault(activity_data["archiveItemUnlockDataMap"][log]["chapterId"], []).append(log)
+
+    deep_sea = {
+        "places": {place: 2 for place in activity_data["placeDataMap"]},
+        "nodes": {node: 2 for node in activity_data["nodeInfoDataMap"]},
+        "choices": {
+            k: [2] * len(v["optionList"])
+            for k, v in activity_data["choiceNodeDataMap"].items()
+        },
+        "events": {event: 1 for event in activity_data["eventDataMap"]},
+        "treasures": {treasure: 1 for treasure in activity_data["treasureNodeDataMap"]},
+        "stories": {story["storyKey"]: 1 for story in activity_data["storyNodeDataMap"].values()},
+        "techTrees": {
+            tech: {"state": 2, "branch": tech_data["defaultBranchId"]}
+            for tech, tech_data in activity_data["techTreeDataMap"].items()
+        },
+        "logs": logs
+    }
+    return json_encoder.encode({
+        "car": car,
+        "deepSea": deep_sea,
+        "activityIds": {i: list(activity_table["activity"][i]) for i in activity_table["activity"]}
+    })
+
+
+@register_index("syncData.storyReview", "story_review_table", "story_review_meta_table")
+def _sync_story_review(story_review_table, story_review_meta_table):
+    trial_data_map = story_review_meta_table["miniActTrialData"]["miniActTrialDataMap"]
+    story_review_groups = {}
+    for i in story_review_table:
+        story_review_groups[i] = {"rts": 1700000000, "stories": [], "trailRewards": []}
+        for j in story_review_table[i]["infoUnlockDatas"]:
+            story_review_groups[i]["stories"].append(
+                {"id": j["storyId"], "uts": 1695000000, "rc": 1}
+            )
+        if i in trial_data_map:
+            for j in trial_data_map[i]["rewardList"]:
+                story_review_groups[i]["trailRewards"].append(j["trialRewardId"])
+    return json_encoder.encode(story_review_groups)
+
+
+@register_index("syncData.enemies", "enemy_handbook_table")
+def _sync_enemies(enemy_handbook_table):
+    if "enemyData" in enemy_handbook_table:
+        enemies = {i: 1 for i in enemy_handbook_table["enemyData"]}
+    else:
+        enemies = {i: 1 for i in enemy_handbook_table}
+    return json_encoder.encode(enemies)
+
+
+@register_index("syncData.medals", "medal_table")
+def _sync_medals(medal_table):
+    medals = {}
+    for i in medal_table["medalList"]:
+        medalId = i["medalId"]
+        medals[medalId] = {
+            "id": medalId,
+            "val": [],
+            "fts": 1695000000,
+            "rts": 1695000000,
+        }
+    return json_encoder.encode(medals)
+
+
+# 阿米娅的升变形态
+AMIYA_TEMPLATES = {
+    "char_002_amiya": {
+        "skills": ["skcom_magic_rage[3]", "skchr_amiya_2", "skchr_amiya_3"],
+        "skin": "char_002_amiya@test#1",
+        "default_index": 2
+    },
+    "char_1001_amiya2": {
+        "skills": ["skchr_amiya2_1", "skchr_amiya2_2"],
+        "skin": "char_1001_amiya2@casc#1",
+        "default_index": 1
+    },
+    "char_1037_amiya3": {
+        "skills": ["skchr_amiya3_1", "skchr_amiya3_2"],
+        "skin": "char_1001_amiya2@casc#1",
+        "default_index": 1
+    }
+}
+
+
+@register_index(
+    "syncData.operators",
+    "character_table", "charword_table", "skin_table", "uniequip_table",
+    uses_config="charConfig"
+)
+def _sync_operators(character_table, charword_table, skin_table, uniequip_table, edit_json):
+    '''
+    全部干员与基建干员的模板，按 instId 索引。
+    gainTime 与 lastApAddTime 依赖同步时的时间，由 accountSyncData 填入
+    '''
+    _, temp_skin_table = get_index("charSkins")
+    equip_index = get_index("charEquip")
+
+    chars = {}
+    building_chars = {}
+    char_group = {}
+    for char_id, char_data in character_table.items():
+        # 跳过非角色键
+        if "char" not in char_id:
+            continue
+        inst_id = int(char_id.split("_")[1])
+        char_group[char_id] = {"favorPoint": 25570}
+
+        # ---------- 角色创建逻辑 ----------
+        # 语音语言处理
+        voice_lan = charword_table["charDefaultTypeDict"].get(char_id, "JP")
+
+        # 进化阶段计算
+        evolve_phase = edit_json["evolvePhase"]
+        max_phase = len(char_data["phases"]) - 1
+        evolve_phase = min(evolve_phase, max_phase) if evolve_phase != -1 else max_phase
+
+        # 等级计算
+        level = (
+            edit_json["level"] if edit_json["level"] != -1
+            else char_data["phases"][evolve_phase]["maxLevel"]
+        )
+
+        # ---------- 皮肤处理 ----------
+        skin = temp_skin_table.get(char_id)
+        if skin is None:
+            # 精二皮肤
+            try:
+                if evolve_phase >= 2 and char_data["displayNumber"] is not None:
+                    skin = f"{char_id}#2"
+                else:
+                    skin = f"{char_id}#1"
+            except KeyError:
+                print(f"Error: No displayNumber for {char_id}")
+                skin = f"{char_id}#1"
+
+        # 基础角色结构
+        operator = {
+            "instId": inst_id,
+            "charId": char_id,
+            "favorPoint": edit_json["favorPoint"],
+            "potentialRank": edit_json["potentialRank"],
+            "mainSkillLvl": edit_json["mainSkillLvl"],
+            "skin": skin,
+            "level": level,
+            "exp": 0,
+            "evolvePhase": evolve_phase,
+            "defaultSkillIndex": len(char_data["skills"]) - 1,
+            "gainTime": 0,
+            "skills": [],
+            "voiceLan": voice_lan,
+            "currentEquip": None,
+            "equip": {},
+            "starMark": 0,
+        }
+
+        # ---------- 技能处理 ----------
+        for skill in char_data["skills"]:
+            operator["skills"].append({
+                "skillId": skill["skillId"],
+                "unlock": 1,
+                "state": 0,
+                "specializeLevel": (
+                    edit_json["skillsSpecializeLevel"]
+                    if skill["levelUpCostCond"] and evolve_phase >= 2
+                    else 0
+                ),
+                "completeUpgradeTime": -1
+            })
+
+        # ---------- 模组处理 ----------
+        if char_equip := equip_index.get(char_id):
+            operator["equip"] = char_equip[0]
+            operator["currentEquip"] = char_equip[1]
+
+        # ---------- 自定义数据覆盖 ----------
+        if custom_data := edit_json["customUnitInfo"].get(char_id):
+            for key, value in custom_data.items():
+                if key == "skills":
+                    for idx, sl in enumerate(value):
+                        operator["skills"][idx]["specializeLevel"] = sl
+                else:
+                    operator[key] = value
+
+        # ---------- 特殊角色处理 ----------
+        # 阿米娅特殊形态
+        if char_id == "char_002_amiya":
+            operator.update({
+                "defaultSkillIndex": -1,
+                "skills": [],
+                "currentTmpl": "char_002_amiya",
+                "tmpl": {
+                    key: {
+                        "skinId": val["skin"],
+                        "defaultSkillIndex": val["default_index"],
+                        "skills": [{
+                            "skillId": skill,
+                            "unlock": 1,
+                            "state": 0,
+                            "specializeLevel": edit_json["skillsSpecializeLevel"],
+                            "completeUpgradeTime": -1
+                        } for skill in val["skills"]],
+                        "currentEquip": None,
+                        "equip": {}
+                    } for key, val in AMIYA_TEMPLATES.items()
+                }
+            })
+            # 处理阿米娅模组
+            for tmpl in AMIYA_TEMPLATES.keys():
+                if tmpl_equip := equip_index.get(tmpl):
+                    operator["tmpl"][tmpl]["equip"] = tmpl_equip[0]
+                    operator["tmpl"][tmpl]["currentEquip"] = tmpl_equip[1]
+
+        # ---------- 基建数据处理 ----------
+        building_chars[str(inst_id)] = {
+            "charId": char_id,
+            "lastApAddTime": 0,
+            "ap": 8640000,
+            "roomSlotId": "",
+            "index": -1,
+            "changeScale": 0,
+            "bubble": {
+                "normal": {"add": -1, "ts": 0},
+                "assist": {"add": -1, "ts": 0}
+            },
+            "workTime": 0
+        }
+
+        chars[str(inst_id)] = operator
+
+    # 编码后不再与 charEquip 索引共享对象
+    return json_encoder.encode({
+        "chars": chars,
+        "buildingChars": building_chars,
+        "charGroup": char_group
+    })
+
+
+# accountSyncData 用到的全部派生数据
+SYNC_DATA_INDEXES = (
+    "syncData.flags", "syncData.stages", "syncData.stageFragments", "syncData.addon", "syncData.retro",
+    "syncData.display", "syncData.charms", "syncData.activity", "syncData.storyReview",
+    "syncData.enemies", "syncData.medals", "syncData.operators", "charSkins", "campStageIds"
+)
+
+
+# 直接替换玩家数据中对应路径的片段：片段名 -> 路径
+SYNC_SECTIONS = (
+    ("syncData.flags", ("user", "status", "flags")),
+    ("syncData.stages", ("user", "dungeon", "stages")),
+    ("syncData.storyReview", ("user", "storyreview", "groups")),
+    ("syncData.enemies", ("user", "dexNav", "enemy", "enemies")),
+    ("syncData.medals", ("user", "medal", "medals")),
+)
+
+
+def sync_data_stamp(config) -> tuple:
+    '''
+    syncData 响应的版本戳：数据版本、配置版本（包括虚拟时间的设置）、读取的文件以及依赖的表。
+    任一部分变化时缓存的响应失效。不包括当前时间，缓存的响应中的时间戳为生成时的时间
+    '''
+    paths = [USER_JSON_PATH, MAILLIST_PATH, BATTLE_REPLAY_JSON_PATH, SQUADS_PATH]
+    if selected_crisis := config["crisisV2Config"]["selectedCrisis"]:
+        paths.append(f"{CRISIS_V2_JSON_BASE_PATH}{selected_crisis}.json")
+
+    files = []
+    for path in paths:
+        if player_store.manages(path):
+            # 由 PlayerStore 检查外部修改（只比较文件状态），重新加载时 loads 会变化
+            player_store.refresh(path)
+            continue
+        try:
+            st = os.stat(path)
+            files.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            files.append(None)
+
+    return (
+        get_data_version(),
+        config_store.version,
+        player_store.loads,
+        tuple(files),
+        tuple(index_version(name) for name in SYNC_DATA_INDEXES),
+        table_version("roguelike_topic_table")
+    )
 
 
 def accountLogin():
@@ -40,37 +489,51 @@ def accountLogin():
 
 
 def accountSyncData():
-    a = datetime.now()
+    profile = Profile("syncdata")
+    # 响应中直接拼接的预编码片段，路径 -> 编码后的片段
+    fragments = {}
     if not exists(USER_JSON_PATH):
         write_json({}, USER_JSON_PATH)
 
+    config = config_store.get()
+    use_response_cache = config["server"].get("syncDataResponseCache", False)
+    if use_response_cache:
+        stamp = sync_data_stamp(config)
+        if (body := response_cache.get("syncData", stamp)) is not None:
+            # 压缩时使用缓存的压缩结果
+            g.response_cache_key = ("syncData", stamp)
+            profile.lap("cached")
+            profile.finish(config["server"].get("syncDataProfileLog", True))
+            return Response(body, mimetype="application/json")
+        start_version = get_data_version()
+        start_writes = g.get("data_writes", 0)
+
+    # 表或配置变化后，各片段互不依赖，并行重建
+    prefetch_indexes(
+        SYNC_DATA_INDEXES + ("charEquip",),
+        config["server"].get("syncDataWorkers", 4),
+        config["server"].get("syncDataProcessThreshold", 0) * 1048576
+    )
+    profile.lap("prefetch")
+
     saved_data = read_json(USER_JSON_PATH)
     mail_data = read_json(MAILLIST_PATH)
     player_data = read_json(SYNC_DATA_TEMPLATE_PATH)
-    config = read_json(CONFIG_PATH)
-
-    # Load newest data
-    skin_table = get_memory("skin_table")
-    character_table = get_memory("character_table")
-    equip_table = get_memory("uniequip_table")
-    display_meta_table = get_memory("display_meta_table")
-    retro_table = get_memory("retro_table")
-    charm_table = get_memory("charm_table")
-    activity_table = get_memory("activity_table")
-    charword_table = get_memory("charword_table")
-    stage_table = get_memory("stage_table")
-    story_table = get_memory("story_table")
-    addon_table = get_memory("handbook_info_table")
-    story_review_table = get_memory("story_review_table")
-    story_review_meta_table = get_memory("story_review_meta_table")
-    enemy_handbook_table = get_memory("enemy_handbook_table")
-    medal_table = get_memory("medal_table")
+
+    # saved_data 与 player_data 读取自同一个文件，在修改 player_data 前保存旧的界面设置
+    saved_ui = None
+    if "user" in saved_data:
+        saved_ui = (
+            saved_data["user"]["status"]["secretarySkinId"],
+            saved_data["user"]["homeTheme"]["selected"]
+        )
+
+    profile.lap("load")
 
     ts = round(time())
     cnt = 0
     cntInstId = 1
     myCharList = {}
-    charGroup = {}
     buildingChars = {}
 
     # charRotation
@@ -104,205 +567,39 @@ def accountSyncData():
     player_data["user"]["background"]["selected"] = player_data["user"]["charRotation"]["preset"][target_current][
         "background"]
 
+    profile.lap("charRotation")
+
     # Tamper Skins
-    # 初始化玩家数据中的皮肤数据
-    character_skins = {}
-    # 初始化临时皮肤表
-    temp_skin_table = {}
-
-    # 遍历皮肤数据
-    for skin_id, skin_data in skin_table["charSkins"].items():
-        # 如果皮肤键中不包含@符号，则跳过
-        if "@" not in skin_id:
-            continue
+    # 全部带@的皮肤，以及角色 -> 该角色最后一个皮肤
+    character_skins, temp_skin_table = get_index("charSkins")
 
-        # 将皮肤键添加到玩家数据中的皮肤数据中
-        character_skins[skin_id] = 1
-        temp_skin_table[skin_data["charId"]] = skin_id
+    player_data["user"]["skin"]["characterSkins"] = dict(character_skins)
 
-    player_data["user"]["skin"]["characterSkins"] = character_skins
+    profile.lap("skins")
 
     # Tamper Operators
     edit_json = config["charConfig"]
-    player_data_keys = set(player_data["user"]["troop"]["chars"].keys())
-
-    # 预定义常量
-    AMIYA_TEMPLATES = {
-        "char_002_amiya": {
-            "skills": ["skcom_magic_rage[3]", "skchr_amiya_2", "skchr_amiya_3"],
-            "skin": "char_002_amiya@test#1",
-            "default_index": 2
-        },
-        "char_1001_amiya2": {
-            "skills": ["skchr_amiya2_1", "skchr_amiya2_2"],
-            "skin": "char_1001_amiya2@casc#1",
-            "default_index": 1
-        },
-        "char_1037_amiya3": {
-            "skills": ["skchr_amiya3_1", "skchr_amiya3_2"],
-            "skin": "char_1001_amiya2@casc#1",
-            "default_index": 1
-        }
-    }
+    troop_chars = player_data["user"]["troop"]["chars"]
 
-    for char_id, char_data in character_table.items():
-        # 跳过非角色键
-        if "char" not in char_id:
-            continue
-        inst_id = int(char_id.split("_")[1])
-        charGroup.update({char_id: {"favorPoint": 25570}})
+    # 模板按表版本与 charConfig 缓存，这里只需补上时间戳
+    templates = sync_section("syncData.operators")
+    charGroup = templates["charGroup"]
+    for inst_id, operator in templates["chars"].items():
         # 存在已有角色数据的情况
-        if str(inst_id) in player_data_keys:
-            myCharList[str(inst_id)] = player_data["user"]["troop"]["chars"][str(inst_id)]
-        else:
-            # ---------- 角色创建逻辑 ---------- 
-            # 语音语言处理
-            voice_lan = charword_table["charDefaultTypeDict"].get(char_id, "JP")
-
-            # 进化阶段计算
-            evolve_phase = edit_json["evolvePhase"]
-            max_phase = len(char_data["phases"]) - 1
-            evolve_phase = min(evolve_phase, max_phase) if evolve_phase != -1 else max_phase
-
-            # 等级计算
-            level = (
-                edit_json["level"] if edit_json["level"] != -1
-                else char_data["phases"][evolve_phase]["maxLevel"]
-            )
-
-            # ---------- 皮肤处理 ----------
-            skin = temp_skin_table.get(char_id)
-            if skin is None:
-                # 精二皮肤
-                try:
-                    if evolve_phase >= 2 and char_data["displayNumber"] is not None:
-                        skin = f"{char_id}#2"
-                    else:
-                        skin = f"{char_id}#1"
-                except KeyError:
-                    print(f"Error: No displayNumber for {char_id}")
-                    skin = f"{char_id}#1"
-
-            # 基础角色结构
-            operator = {
-                "instId": inst_id,
-                "charId": char_id,
-                "favorPoint": edit_json["favorPoint"],
-                "potentialRank": edit_json["potentialRank"],
-                "mainSkillLvl": edit_json["mainSkillLvl"],
-                "skin": skin,
-                "level": level,
-                "exp": 0,
-                "evolvePhase": evolve_phase,
-                "defaultSkillIndex": len(char_data["skills"]) - 1,
-                "gainTime": ts,
-                "skills": [],
-                "voiceLan": voice_lan,
-                "currentEquip": None,
-                "equip": {},
-                "starMark": 0,
-            }
+        if inst_id in troop_chars:
+            myCharList[inst_id] = troop_chars[inst_id]
+            continue
 
-            # ---------- 技能处理 ----------
-            for skill in char_data["skills"]:
-                operator["skills"].append({
-                    "skillId": skill["skillId"],
-                    "unlock": 1,
-                    "state": 0,
-                    "specializeLevel": (
-                        edit_json["skillsSpecializeLevel"]
-                        if skill["levelUpCostCond"] and evolve_phase >= 2
-                        else 0
-                    ),
-                    "completeUpgradeTime": -1
-                })
-
-            # ---------- 模组处理 ----------
-            equip_list = equip_table["charEquip"].get(char_id)
-            equip_dict = equip_table["equipDict"]
-            if equip_list is not None:
-                operator["equip"] = {
-                    equip: {
-                        "hide": 0,
-                        "locked": 0,
-                        "level": (
-                            len(equip_dict[equip]["itemCost"])
-                            if equip_dict[equip].get("itemCost") is not None
-                            else 1
-                        )
-                    } for equip in equip_list
-                }
-                operator["currentEquip"] = equip_list[-1]
-
-            # ---------- 自定义数据覆盖 ----------
-            if custom_data := edit_json["customUnitInfo"].get(char_id):
-                for key, value in custom_data.items():
-                    if key == "skills":
-                        for idx, sl in enumerate(value):
-                            operator["skills"][idx]["specializeLevel"] = sl
-                    else:
-                        operator[key] = value
-
-            # ---------- 特殊角色处理 ----------
-            # 阿米娅特殊形态
-            if char_id == "char_002_amiya":
-                operator.update({
-                    "defaultSkillIndex": -1,
-                    "skills": [],
-                    "currentTmpl": "char_002_amiya",
-                    "tmpl": {
-                        key: {
-                            "skinId": val["skin"],
-                            "defaultSkillIndex": val["default_index"],
-                            "skills": [{
-                                "skillId": skill,
-                                "unlock": 1,
-                                "state": 0,
-                                "specializeLevel": edit_json["skillsSpecializeLevel"],
-                                "completeUpgradeTime": -1
-                            } for skill in val["skills"]],
-                            "currentEquip": None,
-                            "equip": {}
-                        } for key, val in AMIYA_TEMPLATES.items()
-                    }
-                })
-                # 处理阿米娅模组
-                for tmpl in AMIYA_TEMPLATES.keys():
-                    equip_list = equip_table["charEquip"].get(tmpl)
-                    operator["tmpl"][tmpl]["equip"] = {
-                        equip: {
-                            "hide": 0,
-                            "locked": 0,
-                            "level": (
-                                len(equip_dict[equip]["itemCost"])
-                                if equip_dict[equip].get("itemCost") is not None
-                                else 1
-                            )
-                        } for equip in equip_list
-                    }
-                    operator["tmpl"][tmpl]["currentEquip"] = equip_list[-1]
-
-            # ---------- 基建数据处理 ----------
-            buildingChars[inst_id] = {
-                "charId": char_id,
-                "lastApAddTime": ts - 3600,
-                "ap": 8640000,
-                "roomSlotId": "",
-                "index": -1,
-                "changeScale": 0,
-                "bubble": {
-                    "normal": {"add": -1, "ts": 0},
-                    "assist": {"add": -1, "ts": 0}
-                },
-                "workTime": 0
-            }
+        operator["gainTime"] = ts
+        building_char = templates["buildingChars"][inst_id]
+        building_char["lastApAddTime"] = ts - 3600
+        buildingChars[inst_id] = building_char
 
-            # ---------- 最终数据存储 ----------
-            myCharList[inst_id] = operator
-            player_data["user"]["dexNav"]["character"][char_id] = {
-                "charInstId": inst_id,
-                "count": 6
-            }
+        myCharList[inst_id] = operator
+        player_data["user"]["dexNav"]["character"][operator["charId"]] = {
+            "charInstId": operator["instId"],
+            "count": 6
+        }
 
     cntInstId = 10000
 
@@ -319,204 +616,96 @@ def accountSyncData():
                 break
 
         tempChar["instId"] = int(cntInstId)
-        myCharList[int(cntInstId)] = tempChar
+        myCharList[str(cntInstId)] = tempChar
         cntInstId += 1
 
     player_data["user"]["troop"]["chars"] = myCharList
     player_data["user"]["troop"]["charGroup"] = charGroup
     player_data["user"]["troop"]["curCharInstId"] = cntInstId
 
-    # Tamper story
-    myStoryList = {"init": 1}
-    for story in story_table:
-        myStoryList.update({story: 1})
-
-    player_data["user"]["status"]["flags"] = myStoryList
-
-    # Tamper Stages
-    myStageList = {}
+    profile.lap("roster")
 
-    for stage in stage_table["stages"]:
-        myStageList.update({
-            stage: {
-                "completeTimes": 1,
-                "hasBattleReplay": 0,
-                "noCostCnt": 0,
-                "practiceTimes": 0,
-                "stageId": stage_table["stages"][stage]["stageId"],
-                "startTimes": 1,
-                "state": 3
-            }
-        })
+    # Tamper story, stages, story review, enemies and medals
+    player_data["user"]["medal"] = {}
+    for name, path in SYNC_SECTIONS:
+        put_section(player_data, fragments, name, *path)
 
-    player_data["user"]["dungeon"]["stages"] = myStageList
+    profile.lap("sections")
 
     # Tamper addon [paradox&records]
-    addonList = {}
-    for charId in addon_table["handbookDict"]:
-        addonList[charId] = {"story": {}}
-        story = addon_table["handbookDict"][charId]["handbookAvgList"]
-        for i, j in zip(story, range(len(story))):
-            if "storySetId" in i:
-                addonList[charId]["story"].update({
-                    addon_table["handbookDict"][charId]["handbookAvgList"][j]["storySetId"]: {
-                        "fts": 1649232340,
-                        "rts": 1649232340
-                    }
-                })
+    addon = sync_section("syncData.addon")
+    player_data["user"]["troop"]["addon"].update(addon)  # TODO: I might try MongoDB in the future.
+    if len(player_data["user"]["troop"]["addon"]) == len(addon):
+        # 没有表中以外的角色时与片段完全相同
+        fragments[("user", "troop", "addon")] = get_index("syncData.addon")
 
-    for stage in addon_table["handbookStageData"]:
-        addonList[stage].update({
-            "stage": {
-                addon_table["handbookStageData"][stage]["stageId"]: {
-                    "startTimes": 0,
-                    "completeTimes": 1,
-                    "state": 3,
-                    "fts": 1624284657,
-                    "rts": 1624284657,
-                    "startTime": 2
-                }
-            }
-        })
-
-    player_data["user"]["troop"]["addon"].update(addonList)  # TODO: I might try MongoDB in the future.
+    profile.lap("addon")
 
     # Tamper Side Stories and Intermezzis
-    block = {}
-    for retro in retro_table["retroActList"]:
-        block.update({
-            retro: {
-                "locked": 0,
-                "open": 1
-            }
-        })
-    player_data["user"]["retro"]["block"] = block
+    retro = sync_section("syncData.retro")
+    player_data["user"]["retro"]["block"] = retro["block"]
+    player_data["user"]["retro"]["trail"] = retro["trail"]
 
-    trail = {}
-    for retro in retro_table["retroTrailList"]:
-        trail.update({retro: {}})
-        for trailReward in retro_table["retroTrailList"][retro]["trailRewardList"]:
-            trail.update({
-                retro: {
-                    trailReward["trailRewardId"]: 1
-                }
-            })
-    player_data["user"]["retro"]["trail"] = trail
+    profile.lap("retro")
 
     # Tamper Anniliations
-    for stage in stage_table["stages"]:
-        if stage.startswith("camp"):
-            player_data["user"]["campaignsV2"]["instances"].update({
-                stage: {
-                    "maxKills": 400,
-                    "rewardStatus": [1, 1, 1, 1, 1, 1, 1, 1]
-                }
-            })
+    for stage in get_index("campStageIds"):
+        player_data["user"]["campaignsV2"]["instances"].update({
+            stage: {
+                "maxKills": 400,
+                "rewardStatus": [1, 1, 1, 1, 1, 1, 1, 1]
+            }
+        })
 
-            player_data["user"]["campaignsV2"]["sweepMaxKills"].update({stage: 400})
-            player_data["user"]["campaignsV2"]["open"]["permanent"].append(stage)   #TODO 需要去重
-            player_data["user"]["campaignsV2"]["open"]["training"].append(stage)
+        player_data["user"]["campaignsV2"]["sweepMaxKills"].update({stage: 400})
+        player_data["user"]["campaignsV2"]["open"]["permanent"].append(stage)   #TODO 需要去重
+        player_data["user"]["campaignsV2"]["open"]["training"].append(stage)
+
+    profile.lap("campaigns")
 
     # ------------------------------ 
     # 名片皮肤
+    display = sync_section("syncData.display")
     name_card_skin = player_data["user"]["nameCardStyle"]["skin"]["state"]
-    skin_data = display_meta_table["nameCardV2Data"]["skinData"]
-    for key in skin_data.keys():
+    for key in display["nameCardSkins"]:
         # 如果键不存在或者值为None，设置值为ture
         if key not in name_card_skin or name_card_skin[key] is None:
             name_card_skin[key] = {
                 "progress": None,
                 "unlock": True
             }
-        else:
-            pass
 
     # ------------------------------ 
     # 名片头像和背景
-    avatar_icon = {}
-    for avatar in display_meta_table["playerAvatarData"]["avatarList"]:
-        avatar_icon.update({
-            avatar["avatarId"]: {
-                "ts": ts,
-                "src": "initial" if avatar["avatarId"].startswith("avatar_def") else "other"
-            }
-        })
-    player_data["user"]["avatar"]["avatar_icon"] = avatar_icon
+    player_data["user"]["avatar"]["avatar_icon"] = {
+        avatar_id: {"ts": ts, "src": src} for avatar_id, src in display["avatars"]
+    }
+    player_data["user"]["background"]["bgs"] = {bg: {"unlock": ts} for bg in display["bgs"]}
 
-    bgs = {}
-    for bg in display_meta_table["homeBackgroundData"]["homeBgDataList"]:
-        bgs.update({
-            bg["bgId"]: {
-                "unlock": ts
-            }
-        })
-    player_data["user"]["background"]["bgs"] = bgs
+    if display["themes"] is not None:
+        player_data["user"]["homeTheme"]["themes"] = display["themes"]
 
-    if "themeList" in display_meta_table["homeBackgroundData"]:
-        themes = {}
-        for theme in display_meta_table["homeBackgroundData"]["themeList"]:
-            themes[theme["id"]] = {"unlock": 1691670000}
-        player_data["user"]["homeTheme"]["themes"] = themes
+    profile.lap("display")
 
     # ------------------------------ 
     # 更新charms
-    try:
-        for charm in charm_table["charmList"]:
-            player_data["user"]["charm"]["charms"].update({charm["id"]: 1})
-    except TypeError:
-        for charm in charm_table:
-            player_data["user"]["charm"]["charms"].update({charm["id"]: 1})
+    player_data["user"]["charm"]["charms"].update(sync_section("syncData.charms"))
     # ------------------------------ 
     # 更新battle bus
-    if "carData" in activity_table:
-        for car_gear in activity_table["carData"]["carDict"]:
-            player_data["user"]["car"]["accessories"].update({
-                car_gear: {
-                    "id": car_gear,
-                    "num": len(activity_table["carData"]["carDict"][car_gear]["posList"])
-                }
-            })
+    activity_section = sync_section("syncData.activity")
+    player_data["user"]["car"]["accessories"].update(activity_section["car"])
 
     # Update Stultifera Navis
     deep_sea = player_data["user"]["deepSea"]
-    activity_data = activity_table["activity"]["TYPE_ACT17SIDE"]["act17side"]
-    deep_sea.update({
-        "places": {place: 2 for place in activity_data["placeDataMap"]},
-        "nodes": {node: 2 for node in activity_data["nodeInfoDataMap"]},
-        "choices": {
-            k: [2] * len(v["optionList"])
-            for k, v in activity_data["choiceNodeDataMap"].items()
-        }
-    })
-
-    for event in activity_data["eventDataMap"]:
-        player_data["user"]["deepSea"]["events"].update({event: 1})
-
-    for treasure in activity_data["treasureNodeDataMap"]:
-        player_data["user"]["deepSea"]["treasures"].update({treasure: 1})
-
-    for story in activity_data["storyNodeDataMap"]:
-        player_data["user"]["deepSea"]["stories"].update(
-            {activity_data["storyNodeDataMap"][story]["storyKey"]: 1}
-        )
+    deep_sea_section = activity_section["deepSea"]
+    for key in ("places", "nodes", "choices"):
+        deep_sea[key] = deep_sea_section[key]
+    for key in ("events", "treasures", "stories", "techTrees"):
+        deep_sea[key].update(deep_sea_section[key])
+    for chapter, logs in deep_sea_section["logs"].items():
+        deep_sea["logs"].setdefault(chapter, []).extend(logs)
 
-    for tech in activity_data["techTreeDataMap"]:
-        player_data["user"]["deepSea"]["techTrees"].update({
-            tech: {
-                "state": 2,
-                "branch": activity_data["techTreeDataMap"][tech]["defaultBranchId"]
-            }
-        })
-
-    for log in activity_data["archiveItemUnlockDataMap"]:
-        if not log.startswith("act17side_log_"):
-            continue
-
-        chapter = activity_data["archiveItemUnlockDataMap"][log]["chapterId"]
-        if chapter in player_data["user"]["deepSea"]["logs"].keys():
-            player_data["user"]["deepSea"]["logs"][chapter].append(log)
-        else:
-            player_data["user"]["deepSea"]["logs"].update({chapter: [log]})
+    profile.lap("activity")
 
     # Check if mail exists
     received_set = set(mail_data["recievedIDs"])
@@ -536,15 +725,29 @@ def accountSyncData():
     player_data["user"]["crisis"]["nst"] = ts + 3600
     player_data["ts"] = ts
 
+    profile.lap("status")
+
     replay_data = read_json(BATTLE_REPLAY_JSON_PATH)
     replay_data["currentCharConfig"] = md5(b64encode(json.dumps(edit_json).encode())).hexdigest()
     write_json(replay_data, BATTLE_REPLAY_JSON_PATH)
 
     # Enable battle replays
     if replay_data["currentCharConfig"] in list(replay_data["saved"].keys()):
+        stages = player_data["user"]["dungeon"]["stages"]
+        replay_stages = set()
         for replay in replay_data["saved"][replay_data["currentCharConfig"]]:
-            if replay in player_data["user"]["dungeon"]["stages"]:
-                player_data["user"]["dungeon"]["stages"][replay]["hasBattleReplay"] = 1
+            if replay in stages:
+                stages[replay]["hasBattleReplay"] = 1
+                replay_stages.add(replay)
+        if replay_stages:
+            # 只有有回放的关卡需要重新编码
+            stage_fragments = get_index("syncData.stageFragments")
+            fragments[("user", "dungeon", "stages")] = Raw(json_encoder.encode({
+                stage: state if stage in replay_stages else stage_fragments.get(stage, state)
+                for stage, state in stages.items()
+            }))
+
+    profile.lap("replays")
 
     squads_data = read_json(SQUADS_PATH)
     charId2instId = {}
@@ -574,12 +777,13 @@ def accountSyncData():
 
     player_data["user"]["troop"]["squads"] = squads_data
 
+    profile.lap("squads")
+
     secretarySkinId = config["userConfig"]["secretarySkinId"]
     theme = config["userConfig"]["theme"]
 
-    if "user" in saved_data and config["userConfig"]["restorePreviousStates"]["ui"]:
-        secretarySkinId = saved_data["user"]["status"]["secretarySkinId"]
-        theme = saved_data["user"]["homeTheme"]["selected"]
+    if saved_ui is not None and config["userConfig"]["restorePreviousStates"]["ui"]:
+        secretarySkinId, theme = saved_ui
 
     if (current_preset := player_data["user"]["charRotation"]["preset"].get(
             player_data["user"]["charRotation"]["current"]
@@ -594,45 +798,14 @@ def accountSyncData():
 
     player_data["user"]["tower"]["season"]["id"] = season
 
-    story_review_groups = {}
-    for i in story_review_table:
-        story_review_groups[i] = {"rts": 1700000000, "stories": [], "trailRewards": []}
-        for j in story_review_table[i]["infoUnlockDatas"]:
-            story_review_groups[i]["stories"].append(
-                {"id": j["storyId"], "uts": 1695000000, "rc": 1}
-            )
-        if i in story_review_meta_table["miniActTrialData"]["miniActTrialDataMap"]:
-            for j in story_review_meta_table["miniActTrialData"]["miniActTrialDataMap"][
-                i
-            ]["rewardList"]:
-                story_review_groups[i]["trailRewards"].append(j["trialRewardId"])
-    player_data["user"]["storyreview"]["groups"] = story_review_groups
-
-    enemies = {}
-    if "enemyData" in enemy_handbook_table:
-        for i in enemy_handbook_table["enemyData"]:
-            enemies[i] = 1
-    else:
-        for i in enemy_handbook_table:
-            enemies[i] = 1
-    player_data["user"]["dexNav"]["enemy"]["enemies"] = enemies
-
-    for i in activity_table["activity"]:
+    for i, activity_ids in activity_section["activityIds"].items():
         if i not in player_data["user"]["activity"]:
             player_data["user"]["activity"][i] = {}
-        for j in activity_table["activity"][i]:
+        for j in activity_ids:
             if j not in player_data["user"]["activity"][i]:
                 player_data["user"]["activity"][i][j] = {}
 
-    player_data["user"]["medal"] = {"medals": {}}
-    for i in medal_table["medalList"]:
-        medalId = i["medalId"]
-        player_data["user"]["medal"]["medals"][medalId] = {
-            "id": medalId,
-            "val": [],
-            "fts": 1695000000,
-            "rts": 1695000000,
-        }
+    profile.lap("ui")
 
     rlv2_table = get_memory("roguelike_topic_table")
     for theme in player_data["user"]["rlv2"]["outer"]:
@@ -647,11 +820,26 @@ def accountSyncData():
         season = rune["info"]["seasonId"]
         player_data["user"]["crisisV2"]["current"] = season
 
+    profile.lap("rlv2")
+
     write_json(player_data, USER_JSON_PATH)
 
-    b = datetime.now()
-    print(f"syncdata耗时: {b - a}")
-    return player_data
+    profile.lap("write")
+    body = encode_with_fragments(player_data, fragments)
+    if use_response_cache:
+        # 版本戳只计算一次，检查与缓存都使用这一个值：
+        # 版本戳中的数据版本必须正好是开始时的版本加上本次请求自己的写入次数，且之后没有其他写入，
+        # 否则响应可能没有包含其他请求的修改，不缓存。检查之后才发生的写入会使数据版本变化，缓存不会再命中
+        own_writes = g.get("data_writes", 0) - start_writes
+        stamp = sync_data_stamp(config)
+        if stamp[0] == start_version + own_writes == get_data_version():
+            response_cache.put("syncData", stamp, body)
+            g.response_cache_key = ("syncData", stamp)
+    response = Response(body, mimetype="application/json")
+
+    profile.lap("encode")
+    profile.finish(config["server"].get("syncDataProfileLog", True))
+    return response
 
 
 def accountSyncStatus():
@@ -0,0 +1,57 @@
+from flask import request, Response
+
+from configstore import config_store
+from profiler import get_profiles
+from memreport import memory_report, supported as memory_report_supported
+from metrics import metrics
+from responsecache import response_cache
+from tablecache import resident_size
+import utils
+
+
+def reloadConfig():
+    # 手动修改config.json后可调用此接口立即生效（修改时间变化时也会自动重新加载）
+    config_store.reload()
+
+    return {
+        "result": 0,
+        "version": config_store.version
+    }
+
+
+def tableStats():
+    # 预加载统计，未开启 preloadReport 时在此处补算内存占用
+    for key, stats in utils.table_stats.items():
+        if stats["residentSize"] is None and key in utils.memory_cache:
+            stats["residentSize"] = resident_size(utils.memory_cache[key])
+
+    return {
+        "tables": utils.table_stats,
+        "failures": utils.preload_failures,
+        "lru": utils.table_lru.stats()
+    }
+
+
+def profiles():
+    # 最近的分阶段耗时记录，可用 ?name=syncdata 过滤
+    return {
+        "profiles": get_profiles(request.args.get("name"))
+    }
+
+
+def responseCache():
+    # 响应缓存的命中次数与缓存的大小
+    return response_cache.stats()
+
+
+def memoryReport():
+    # 服务端各进程独占与共享的内存（需要 Linux 的 /proc/<pid>/smaps_rollup，不支持时 processes 为空）
+    return {
+        "supported": memory_report_supported(),
+        "processes": memory_report()
+    }
+
+
+def metricsText():
+    # Prometheus 文本格式的请求统计
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
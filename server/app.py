@@ -4,24 +4,55 @@ from datetime import datetime
 
 from flask import Flask
 
-from utils import read_json, preload_json_data, start_global_event_loop
-from constants import CONFIG_PATH
+from utils import preload_json_data, start_global_event_loop, player_store
+from configstore import config_store
+from profiler import set_history_size
+from jsonprovider import MsgspecJSONProvider
+from compression import compress_response
+from metrics import metrics
+from recorder import record_request
+from gachapool import pool_registry
+from gachahistory import history_store
 
 import account, background, building, campaignV2, char, charBuild, charm, \
         crisis, deepsea, gacha, mail, online, tower, quest, pay, rlv2, shop, story, \
         user, asset.assetbundle, config.prod, social, templateShop, other, sandbox, charrotation, \
-        activity, vecbreak, mission
+        activity, vecbreak, mission, admin.manage
 
-server_config = read_json(CONFIG_PATH)
+server_config = config_store.get()
 
 app = Flask(__name__)
+if server_config["server"].get("useMsgspecJson", False):
+    # 未设置 compactJson 时与 Flask 一致，仅在调试模式下缩进
+    app.json = MsgspecJSONProvider(app, server_config["server"].get("compactJson"))
+if server_config["server"].get("enableMetrics", False):
+    # after_request 按注册的相反顺序执行，先注册的统计在压缩之后执行，记录的是压缩后的大小
+    app.before_request(metrics.before_request)
+    app.after_request(metrics.after_request)
+    app.teardown_request(metrics.teardown_request)
+app.after_request(compress_response)
+app.before_request(record_request)
 host = server_config["server"]["host"]
 port = server_config["server"]["port"]
-useMemoryCache = server_config["server"]["useMemoryCache"]
+usePlayerStore = server_config["server"].get("usePlayerStore", False)
+playerStoreFlushInterval = server_config["server"].get("playerStoreFlushInterval", 5)
+usePlayerJournal = server_config["server"].get("usePlayerJournal", False)
+journalCheckpointInterval = server_config["server"].get("journalCheckpointInterval", 200)
+gachaHistoryCheckpointInterval = server_config["server"].get("gachaHistoryCheckpointInterval", 1000)
+
+set_history_size(server_config["server"].get("profileHistory", 100))
 
 logger = logging.getLogger('werkzeug')
 logger.setLevel(logging.INFO)
-logger.addFilter(lambda record: not re.match(r'.*(/syncPushMessage|/pb/async|/event|/batch_event).*', record.getMessage()))
+quiet_paths = re.compile(r'/syncPushMessage|/pb/async|/event|/batch_event')
+logger.addFilter(lambda record: not quiet_paths.search(record.getMessage()))
+
+app.add_url_rule("/admin/reloadConfig", methods = ["GET", "POST"], view_func = admin.manage.reloadConfig)
+app.add_url_rule("/admin/tableStats", methods = ["GET"], view_func = admin.manage.tableStats)
+app.add_url_rule("/admin/profiles", methods = ["GET"], view_func = admin.manage.profiles)
+app.add_url_rule("/admin/responseCache", methods = ["GET"], view_func = admin.manage.responseCache)
+app.add_url_rule("/admin/memory", methods = ["GET"], view_func = admin.manage.memoryReport)
+app.add_url_rule("/metrics", methods = ["GET"], view_func = admin.manage.metricsText)
 
 app.add_url_rule("/app/getSettings", methods = ["POST"], view_func = user.appGetSettings)
 app.add_url_rule("/app/getCode", methods = ["POST"], view_func = user.appGetCode)
@@ -309,11 +340,60 @@ app.add_url_rule('/recalRune/battleFinish', methods=['POST'], view_func=crisis.r
 def writeLog(data):
     print(f'[{datetime.now()}] {data}')
 
-if __name__ == "__main__":
-    start_global_event_loop()
-    if useMemoryCache:
+def load_tables(force: bool = False):
+    '''
+    useMemoryCache 开启时把全部表加载到内存
+
+    :param force: 不论 useMemoryCache 如何都加载，并在之后一直使用内存缓存（gunicorn 主进程预加载时使用）
+    '''
+    if force:
+        config_store.force_memory_cache()
+    if config_store.use_memory_cache():
         writeLog('Loading all table data to memory')
         preload_json_data()
         writeLog('Sucessfully loaded all table data')
-    writeLog('[SERVER] Server started at http://' + host + ":" + str(port))
-    app.run(host=host, port=port, debug=True)
+        writeLog(f'Loaded {pool_registry.warm()} gacha pools')
+
+def start_background_tasks(workers: int = 1):
+    '''
+    启动事件循环与 PlayerStore 的写回线程。多进程运行时需要在每个工作进程中调用
+
+    :param workers: 工作进程数，大于1时各进程的常驻数据互不可见，PlayerStore 改为每次立即写盘并关闭日志，
+        寻访记录只追加日志，不再由工作进程重写快照
+    '''
+    start_global_event_loop()
+    history_store.checkpoint_interval = gachaHistoryCheckpointInterval if workers <= 1 else 0
+    if usePlayerStore:
+        flush_interval, journal = playerStoreFlushInterval, usePlayerJournal
+        if workers > 1 and (flush_interval > 0 or journal):
+            flush_interval, journal = 0, False
+            writeLog(f'{workers} worker processes: player data will be written immediately, journal disabled')
+        player_store.start(flush_interval, journal, journalCheckpointInterval)
+        writeLog(f'Player data will be kept in memory, flush interval: {flush_interval}s')
+        if journal:
+            writeLog(f'Player data journal enabled, checkpoint every {journalCheckpointInterval} records')
+
+def run_server():
+    mode = server_config["server"].get("serverMode", "werkzeug")
+    if mode == "waitress":
+        try:
+            from waitress import serve
+        except ImportError:
+            writeLog('waitress is not installed, falling back to the threaded server')
+        else:
+            threads = server_config["server"].get("serverThreads", 8)
+            writeLog(f'[SERVER] Server started at http://{host}:{port} (waitress, {threads} threads)')
+            serve(app, host=host, port=port, threads=threads)
+            return
+
+    if mode in ("werkzeug", "dev"):
+        writeLog('[SERVER] Server started at http://' + host + ":" + str(port))
+        app.run(host=host, port=port, debug=True)
+    else:
+        writeLog(f'[SERVER] Server started at http://{host}:{port} (threaded)')
+        app.run(host=host, port=port, debug=False, threaded=True, use_reloader=False)
+
+if __name__ == "__main__":
+    load_tables()
+    start_background_tasks()
+    run_server()
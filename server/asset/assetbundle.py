@@ -5,7 +5,7 @@ import requests
 
 from datetime import datetime
 from flask import Response, stream_with_context, redirect, send_file, send_from_directory
-from constants import CONFIG_PATH
+from configstore import config_store
 from core.function.loadMods import loadMods
 from utils import read_json, write_json
 
@@ -30,12 +30,12 @@ def writeLog(data):
 def getFile(assetsHash, fileName):
 
     global MODS_LIST
-    server_config = read_json(CONFIG_PATH)
+    server_config = config_store.get()
     mode = server_config["server"]["mode"]
     version = server_config["version"]["android"]["resVersion"]
     basePath  = os.path.join('.', 'assets', version, 'redirect')
     
-    if fileName == 'hot_update_list.json' and read_json(CONFIG_PATH)["assets"]["enableMods"]:
+    if fileName == 'hot_update_list.json' and server_config["assets"]["enableMods"]:
         MODS_LIST = loadMods()
 
     if not server_config["assets"]["downloadLocally"]:
@@ -89,7 +89,7 @@ def downloadFile(url, filePath):
 
 def export(url, basePath, fileName, filePath, assetsHash, redownload = False):
 
-    server_config = read_json(CONFIG_PATH)
+    server_config = config_store.get()
 
     if os.path.basename(filePath) == 'hot_update_list.json':
         
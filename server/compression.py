@@ -0,0 +1,84 @@
+import gzip
+
+from typing import Optional
+
+from flask import Response, g, request
+
+from configstore import config_store
+from responsecache import response_cache
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _accepts(accept_encoding: str, encoding: str) -> bool:
+    for item in accept_encoding.split(","):
+        name, *params = item.split(";")
+        if name.strip().lower() != encoding:
+            continue
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "q":
+                # q=0 表示不接受
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    '''根据 Accept-Encoding 选择压缩方式，zstd 需要安装 zstandard'''
+    if zstandard is not None and _accepts(accept_encoding, "zstd"):
+        return "zstd"
+    if _accepts(accept_encoding, "gzip"):
+        return "gzip"
+    return None
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    # mtime 固定为0，相同的内容得到相同的压缩结果
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress_response(response: Response) -> Response:
+    '''
+    after_request：响应体超过 compressMinSize 字节且客户端支持时进行压缩。
+    由 ResponseCache 提供的响应（g.response_cache_key）会同时缓存压缩后的结果
+    '''
+    server_config = config_store.server()
+    if not server_config.get("compressResponses", False):
+        return response
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    encoding = choose_encoding(request.headers.get("Accept-Encoding", ""))
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < server_config.get("compressMinSize", 16384):
+        return response
+
+    cache_key = g.get("response_cache_key")
+    compressed = None
+    if cache_key is not None:
+        compressed = response_cache.get_compressed(cache_key[0], cache_key[1], encoding)
+    if compressed is None:
+        compressed = compress(data, encoding, server_config.get("compressLevel", 1))
+        if cache_key is not None:
+            response_cache.put_compressed(cache_key[0], cache_key[1], encoding, compressed)
+
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
@@ -4,7 +4,9 @@ import requests
 
 from flask import request
 from random import shuffle
+from copy import deepcopy
 from constants import CONFIG_PATH
+from configstore import config_store
 from utils import read_json, write_json
 
 
@@ -27,8 +29,8 @@ def prodRefreshConfig():
 
 def prodAndroidVersion():
 
-    server_config = read_json(CONFIG_PATH)
-    version = server_config["version"]["android"]
+    server_config = config_store.get()
+    version = dict(server_config["version"]["android"])
 
     if server_config["assets"]["enableMods"]:
         version["resVersion"] = version["resVersion"][:18] + randomHash()
@@ -38,14 +40,15 @@ def prodAndroidVersion():
 
 def prodNetworkConfig():
 
-    server_config = read_json(CONFIG_PATH)
+    server_config = config_store.get()
 
     mode = server_config["server"]["mode"]
     server = request.host_url[:-1]
-    network_config = server_config["networkConfig"][mode]
+    network_config = deepcopy(server_config["networkConfig"][mode])
     funcVer = network_config["content"]["funcVer"]
 
     if server_config["assets"]["autoUpdate"]:
+        server_config = read_json(CONFIG_PATH)
         if mode == "cn":
             version = requests.get("https://ak-conf.hypergryph.com/config/prod/official/Android/version")
         elif mode == "global":
@@ -66,15 +69,14 @@ def prodNetworkConfig():
 
 def prodRemoteConfig():
 
-    remote = read_json(CONFIG_PATH)["remote"]
+    remote = config_store.get()["remote"]
 
     return json.dumps(remote)
 
 
 def prodPreAnnouncement():
 
-    server_config = read_json(CONFIG_PATH)
-    mode = server_config["server"]["mode"]
+    mode = config_store.mode()
     match mode:
         case "cn":
             data = requests.get("https://ak-conf.hypergryph.com/config/prod/announce_meta/Android/preannouncement.meta.json")
@@ -88,8 +90,7 @@ def prodPreAnnouncement():
 
 def prodAnnouncement():
 
-    server_config = read_json(CONFIG_PATH)
-    mode = server_config["server"]["mode"]
+    mode = config_store.mode()
     match mode:
         case "cn":
             data = requests.get("https://ak-conf.hypergryph.com/config/prod/announce_meta/Android/preannouncement.meta.json")
@@ -109,7 +110,7 @@ def prodGateMeta():
 
 def get_latest_game_info():
 
-    server_config = read_json(CONFIG_PATH)
+    server_config = config_store.get()
     mode = server_config["server"]["mode"]
     match mode:
         case "cn":
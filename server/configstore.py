@@ -0,0 +1,103 @@
+import os
+import threading
+
+from typing import Any, Dict, Optional, Tuple, Union
+
+from msgspec.json import Decoder
+
+from constants import CONFIG_PATH
+
+json_decoder = Decoder(strict=False)
+
+
+class ConfigStore:
+    '''
+    config.json 的只读快照。
+
+    文件只在第一次访问或修改时间变化时解析，各模块通过访问器读取配置，避免每次请求重复解析。
+    返回的字典是共享对象，不要直接修改；需要修改并写回配置时请继续使用 read_json/write_json。
+
+    :param path: 配置文件路径
+    '''
+
+    def __init__(self, path: str):
+        self._path = path
+        self._data: Optional[Dict[str, Any]] = None
+        self._stat: Optional[Tuple[int, int]] = None
+        self._version = 0
+        self._lock = threading.Lock()
+        # 不为 None 时覆盖配置中的 useMemoryCache
+        self._memory_cache_override: Optional[bool] = None
+
+    @property
+    def version(self) -> int:
+        '''配置每重新加载一次加一，供依赖配置的缓存判断是否失效'''
+        self.get()
+        return self._version
+
+    def get(self) -> Dict[str, Any]:
+        '''返回完整的配置快照，文件被修改过时自动重新加载'''
+        st = os.stat(self._path)
+        stat = (st.st_mtime_ns, st.st_size)
+        if self._data is None or stat != self._stat:
+            with self._lock:
+                if self._data is None or stat != self._stat:
+                    with open(self._path, "rb") as f:
+                        self._data = json_decoder.decode(f.read())
+                    self._stat = stat
+                    self._version += 1
+        return self._data
+
+    def reload(self) -> Dict[str, Any]:
+        '''强制重新加载配置文件'''
+        with self._lock:
+            self._data = None
+        return self.get()
+
+    def server(self) -> Dict[str, Any]:
+        return self.get()["server"]
+
+    def mode(self) -> str:
+        return self.get()["server"]["mode"]
+
+    def use_memory_cache(self) -> bool:
+        if self._memory_cache_override is not None:
+            return self._memory_cache_override
+        return bool(self.get()["server"]["useMemoryCache"])
+
+    def force_memory_cache(self, enabled: Optional[bool] = True):
+        '''不论配置如何启用（或关闭）表的内存缓存，为 None 时恢复使用配置中的 useMemoryCache'''
+        self._memory_cache_override = enabled
+
+    def virtual_time(self) -> Union[int, str]:
+        return self.get()["server"]["virtualtime"]
+
+    def assets(self) -> Dict[str, Any]:
+        return self.get()["assets"]
+
+    def char_config(self) -> Dict[str, Any]:
+        return self.get()["charConfig"]
+
+    def user_config(self) -> Dict[str, Any]:
+        return self.get()["userConfig"]
+
+    def gacha(self) -> Dict[str, Any]:
+        return self.get().get("gacha", {})
+
+    def six_star_only(self) -> bool:
+        return bool(self.gacha().get("sixStarOnly", False))
+
+    def rlv2_all_chars(self) -> bool:
+        return bool(self.get()["rlv2Config"]["allChars"])
+
+    def selected_crisis(self) -> str:
+        return self.get()["crisisConfig"]["selectedCrisis"]
+
+    def selected_crisis_v2(self) -> str:
+        return self.get()["crisisV2Config"]["selectedCrisis"]
+
+    def tower_season(self) -> str:
+        return self.get()["towerConfig"]["season"]
+
+
+config_store = ConfigStore(CONFIG_PATH)
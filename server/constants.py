@@ -8,6 +8,7 @@ SQUADS_PATH = "config/squads.json"
 SYNC_DATA_TEMPLATE_PATH = "data/user/user.json"
 ASSIST_PATH = "config/assist.json"
 # Gacha Data
+GACHA_POOL_DIR = "data/gacha"
 NORMALGACHA_PATH = "data/gacha/normalGacha.json"
 GACHA_HISTORY_PATH = "data/user/gachaHistory.json"
 
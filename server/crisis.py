@@ -2,15 +2,17 @@ from virtualtime import time
 
 from flask import request
 
-from constants import CONFIG_PATH, CRISIS_JSON_BASE_PATH, CRISIS_V2_JSON_BASE_PATH, RUNE_JSON_PATH, SHOP_PATH, \
+from constants import CRISIS_JSON_BASE_PATH, CRISIS_V2_JSON_BASE_PATH, RUNE_JSON_PATH, SHOP_PATH, \
     USER_JSON_PATH, CRISIS_V2_TABLE_PATH
 from utils import read_json, write_json, decrypt_battle_data
+from configstore import config_store
+from responsecache import file_response
 
 
 def crisisGetCrisisInfo():
 
     data = request.data
-    selected_crisis = read_json(CONFIG_PATH)["crisisConfig"]["selectedCrisis"]
+    selected_crisis = config_store.selected_crisis()
 
     if selected_crisis:
         rune = read_json(f"{CRISIS_JSON_BASE_PATH}{selected_crisis}.json")
@@ -62,7 +64,7 @@ def crisisBattleStart():
 
     data = request.data
     data = request.get_json()
-    selected_crisis = read_json(CONFIG_PATH)["crisisConfig"]["selectedCrisis"]
+    selected_crisis = config_store.selected_crisis()
     rune_data = read_json(f"{CRISIS_JSON_BASE_PATH}{selected_crisis}.json", encoding="utf8")["data"]["stageRune"][data["stageId"]]
 
     total_risks = 0
@@ -112,11 +114,9 @@ def crisisBattleFinish():
     return data
 
 def crisisV2_getInfo():
-    selected_crisis = read_json(CONFIG_PATH)["crisisV2Config"]["selectedCrisis"]
+    selected_crisis = config_store.selected_crisis_v2()
     if selected_crisis:
-        rune = read_json(
-            f"{CRISIS_V2_JSON_BASE_PATH}{selected_crisis}.json"
-        )
+        return file_response("crisisV2Info", f"{CRISIS_V2_JSON_BASE_PATH}{selected_crisis}.json")
     else:
         rune = {
             "info": {},
@@ -145,7 +145,7 @@ def crisisV2_battleFinish():
     mapId = battle_data["mapId"]
     runeSlots = battle_data["runeSlots"]
     scoreCurrent = [0, 0, 0, 0, 0, 0]
-    selected_crisis = read_json(CONFIG_PATH)["crisisV2Config"]["selectedCrisis"]
+    selected_crisis = config_store.selected_crisis_v2()
     rune = read_json(
         f"{CRISIS_V2_JSON_BASE_PATH}{selected_crisis}.json"
     )
@@ -1,18 +1,20 @@
-from flask import request, redirect
+from flask import request, redirect, Response
 from virtualtime import time
 
 from constants import (
     NORMALGACHA_PATH, 
     SYNC_DATA_TEMPLATE_PATH, 
     USER_JSON_PATH,
-    GACHA_HISTORY_PATH,
     SERVER_DATA_PATH
 )
 from utils import read_json, write_json, get_memory
+from configstore import config_store
+from tableindex import get_index
+from gachaengine import get_compiled_pool, six_star_bonus
+from gachapool import pool_registry, pool_type
+from gachahistory import history_store
 
 import json
-import random
-import os
 
 def syncNormalGacha():
 
@@ -86,27 +88,10 @@ def finishNormalGacha():
     user_data = read_json(USER_JSON_PATH, encoding="utf8")
     chars = user_data["user"]["troop"]["chars"]  # 玩家角色数据
     building_chars = user_data["user"]["building"]["chars"]  # 建筑角色数据
-    avail_char_info = read_json(NORMALGACHA_PATH)["detailInfo"]["availCharInfo"]["perAvailList"]  # 可用角色信息
-    random_rank_array = []  # 随机等级数组
-    
-    # 读取配置文件检查是否启用六星限制
-    config_data = read_json("config/config.json", encoding="utf-8")
-    six_star_only = config_data.get("gacha", {}).get("sixStarOnly", False)
-
-    for i, char_info in enumerate(avail_char_info):
-        total_percent = int(char_info["totalPercent"] * 100)  # 总百分比
-        rarity_rank = char_info["rarityRank"]  # 稀有度等级
-        
-        # 如果启用了六星限制，只允许六星角色
-        if six_star_only and rarity_rank != 5:
-            continue
-
-        random_rank_object = {"rarityRank": rarity_rank, "index": i}  # 随机等级对象
-        random_rank_array.extend([random_rank_object] * total_percent)
 
-    random.shuffle(random_rank_array)  # 打乱顺序
-    random_rank = random.choice(random_rank_array)  # 随机选择等级
-    random_char_id = random.choice(avail_char_info[random_rank["index"]]["charIdList"])  # 随机选择角色ID
+    # 按 totalPercent 抽取稀有度，再在该稀有度中等概率抽取角色；启用六星限制时只保留六星
+    compiled_pool = get_compiled_pool(NORMALGACHA_PATH, 100, False, config_store.six_star_only())
+    _, _, random_char_id = compiled_pool.draw()
 
     repeat_char_id = 0  # 重复角色ID
     for j in range(1, len(chars) + 1):
@@ -256,11 +241,9 @@ def getPoolDetail():
     json_body = request.get_json()
     pool_Id = json_body["poolId"]
 
-    try:
-        pool = read_json(f"data/gacha/{pool_Id}.json")
-    except:
-        pool = read_json(f"data/gacha/DEFAULT.json")
-    return pool
+    # 卡池不存在时返回 DEFAULT 卡池
+    pool = pool_registry.get_or_default(pool_Id)
+    return Response(pool.body, mimetype="application/json")
 
 def boostNormalGacha():
     json_body = request.get_json()
@@ -341,43 +324,38 @@ def tenAdvancedGacha():
     else:
         return Gacha("tenGachaTicket", 6000, json_body)
 
-def Gacha(ticket_type, use_diamond_shard, json_body):
+def Gacha(ticket_type, use_diamond_shard, json_body, draw_count=None):
+    '''
+    寻访。全部结果先在内存中计算，结束后用户数据与保底次数各写入一次，历史记录追加一次
+
+    :param draw_count: 抽卡次数，为 None 时根据合成玉数量与卡池类型计算（测试时可指定任意次数）
+    '''
     # 读取用户同步数据
     user_json_data = read_json(USER_JSON_PATH)
-    # 读取卡池历史记录数据
-    gacha_history_data = read_json(GACHA_HISTORY_PATH)
     # 读取角色信息数据
     character_table_data = get_memory("character_table")
     # 获取卡池ID
     pool_id = json_body['poolId']
-    # 获取卡池路径
-    try: 
-        pool_path = os.path.join(os.getcwd(), 'data', 'gacha', f'{pool_id}.json')
-    except:
-        pool_path = os.path.join(os.getcwd(), 'data', 'gacha', 'DEFAULT.json')
     #读取卡池信息
     server_data = read_json(SERVER_DATA_PATH)
     ex_gacha_data = server_data["gacha"]["count"]
     # 获取当前时间戳
     ts = time()
 
-    prefix_mapping = {
-        "NORM": "NORM",
-        "BOOT": "BOOT",
-        "CLASSIC": "CLASSIC"
-    }
-
-    gacha_type = next((value for prefix, value in prefix_mapping.items() if json_body["poolId"].startswith(prefix)), json_body["poolId"])
+    gacha_type = pool_type(pool_id)
 
     # 如果卡池文件不存在，返回错误信息
-    if not os.path.exists(pool_path):
+    pool_entry = pool_registry.get(pool_id)
+    if pool_entry is None:
         return {
             "result": 1,
             "errMsg": "未找到该卡池文件"
         }
 
-    # 读取卡池数据
-    pool_json = read_json(pool_path)
+    # 编译后的卡池按文件与六星限制配置缓存
+    compiled_pool = get_compiled_pool(
+        pool_entry.path, 200, not pool_id.startswith("BOOT"), config_store.six_star_only(), pool_entry.pool
+    )
 
     # 获取目标卡池的保底数，如果不存在则设置为 0
     gacha_count = ex_gacha_data.setdefault(gacha_type, 0)
@@ -390,28 +368,32 @@ def Gacha(ticket_type, use_diamond_shard, json_body):
     chars = user_json_data["user"]['troop']['chars']
 
     # 根据卡池类型计算抽卡次数
-    if pool_id.startswith("BOOT"):
-        draw_count = use_diamond_shard // 380
-    else:
-        draw_count = use_diamond_shard // 600
+    if draw_count is None:
+        if pool_id.startswith("BOOT"):
+            draw_count = use_diamond_shard // 380
+        else:
+            draw_count = use_diamond_shard // 600
 
-    # 循环抽卡
-    for for_times, _ in enumerate(range(draw_count)):
-        # 判断是否使用寻访凭证
-        if json_body['useTkt'] in [1, 2, 6, 7]:
-            # 判断剩余寻访凭证是否足够
-            if user_json_data["user"]['status'][ticket_type] <= 0:
-                return {
-                    "result": 2,
-                    "errMsg": "剩余寻访凭证不足"
-                }
-        # 判断剩余合成玉是否足够
-        elif user_json_data["user"]['status']['diamondShard'] < use_diamond_shard:
+    # 判断是否使用寻访凭证（抽卡过程中不扣除，只需在开始前检查一次）
+    if json_body['useTkt'] in [1, 2, 6, 7]:
+        # 判断剩余寻访凭证是否足够
+        if user_json_data["user"]['status'][ticket_type] <= 0:
             return {
-                "result": 3,
-                "errMsg": "剩余合成玉不足"
+                "result": 2,
+                "errMsg": "剩余寻访凭证不足"
             }
+    # 判断剩余合成玉是否足够
+    elif user_json_data["user"]['status']['diamondShard'] < use_diamond_shard:
+        return {
+            "result": 3,
+            "errMsg": "剩余合成玉不足"
+        }
+
+    # 本次寻访的历史记录
+    history_records = []
 
+    # 循环抽卡
+    for for_times, _ in enumerate(range(draw_count)):
         # 初始化最小值标志
         minimum = False
         # 初始化卡池对象名称
@@ -457,48 +439,9 @@ def Gacha(ticket_type, use_diamond_shard, json_body):
             #     user_json_data['gacha'][pool_object_name][pool_id]['avail'] = False
             #     minimum = True
 
-        # 获取卡池角色信息
-        avail_char_info = pool_json['detailInfo']['availCharInfo']['perAvailList']
-        # 如果不是新手卡池，获取卡池UP角色信息
-        if not pool_id.startswith('BOOT'):
-            try:
-                up_char_info = pool_json['detailInfo']['upCharInfo']['perCharList']
-            except Exception:
-                up_char_info = []
-
-        # 初始化随机权重数组
-        random_rank_array = []
-
-        # 读取配置文件检查是否启用六星限制
-        config_data = read_json("config/config.json")
-        six_star_only = config_data.get("gacha", {}).get("sixStarOnly", False)
-        
-        # 遍历卡池角色信息
-        for i, char_info in enumerate(avail_char_info):
-            # 权重转换为整数
-            total_percent = int(float(char_info['totalPercent']) * 200)
-            # 获取稀有度等级
-            rarity_rank = char_info['rarityRank']
-            
-            # 如果启用了六星限制，只允许六星角色
-            if six_star_only and rarity_rank != 5:
-                continue
-                
-            # 如果稀有度等级为5，增加权重
-            if rarity_rank == 5:
-                total_percent += (gacha_count + 50) // 50 * 2
-
-            # 如果不是最小值或者稀有度等级大于等于卡池稀有度，添加权重
-            if not minimum or rarity_rank >= pool['rarity']:
-                random_rank_array.extend([{
-                    "rarityRank": rarity_rank,
-                    "index": i
-                }] * total_percent)
-
-        # 打乱随机权重数组
-        random.shuffle(random_rank_array)
-        # 随机选择权重
-        random_rank = random.choice(random_rank_array)
+        # 按稀有度权重（六星随保底次数增加）抽取稀有度，再按 UP 权重抽取角色
+        random_rank_value, random_rank_index, random_char_id = compiled_pool.draw(six_star_bonus(gacha_count))
+        random_rank = {"rarityRank": random_rank_value, "index": random_rank_index}
 
         # 该部分代码在该分支中是不被需要的
         # 如果pool_id以'BOOT'开头，并且random_rank的rarityRank大于等于pool的rarity
@@ -512,25 +455,7 @@ def Gacha(ticket_type, use_diamond_shard, json_body):
 
         # 处理保底次数
         ex_gacha_data[gacha_type] = gacha_count
-        write_json(server_data, SERVER_DATA_PATH)
-
-        # 获取随机角色ID列表
-        random_char_array = avail_char_info[random_rank['index']]['charIdList']
-
-        # 如果不是新手卡池，添加UP角色权重
-        if not pool_id.startswith('BOOT'):
-            try:
-                for up_char in up_char_info:
-                    if up_char['rarityRank'] == random_rank['rarityRank']:
-                        up_char_percent = int(up_char['percent'] * 100) - 15
-                        random_char_array.extend(up_char['charIdList'] * up_char_percent)
-            except Exception:
-                pass
-
-        # 打乱随机角色ID列表
-        random.shuffle(random_char_array)
-        # 随机选择角色ID
-        random_char_id = random.choice(random_char_array)
+
         # 初始化重复角色ID
         repeat_char_id = 0
 
@@ -723,42 +648,22 @@ def Gacha(ticket_type, use_diamond_shard, json_body):
                 "itemGet": item_get
             })
         
-        #历史记录写入
+        #历史记录
         char_name = character_table_data[random_char_id]["name"]
-        history_data = {
+        history_records.append({
             "charId": random_char_id,
             "charName": char_name,
             "rarity": random_rank['rarityRank'],
             "isNew": isNew,
             "gachaTs": ts,
             "pos": for_times
-        }
-
-        # 确保 gacha_id 在 history_data 中存在
-        if pool_id not in gacha_history_data:
-            gacha_history_data[pool_id] = []
-
-        # 提取现有数据
-        existing_data = gacha_history_data[pool_id]
-
-        # 构建索引字典，用于快速查找现有数据的位置
-        index_map = {(item.get('gachaTs'), item.get('pos')): idx for idx, item in enumerate(existing_data)}
-
-       # 处理单个新数据
-        unique_key = (history_data.get('gachaTs'), history_data.get('pos'))
-        if unique_key in index_map:
-            # 如果 gachaTs 和 pos 相同，覆盖原位置
-            existing_data[index_map[unique_key]] = history_data
-        else:
-            # 如果 gachaTs 和 pos 不同，插入到最前面
-            existing_data.insert(0, history_data)
+        })
 
-        # 更新回到 gacha_history_data
-        gacha_history_data[pool_id] = existing_data
-        # 写入历史记录
-        write_json(gacha_history_data, GACHA_HISTORY_PATH)
+    # 历史记录追加到日志（gachaTs 和 pos 相同的记录会被覆盖）
+    history_store.append(pool_id, history_records)
 
-    # 写入用户数据
+    # 保底次数与用户数据各写入一次
+    write_json(server_data, SERVER_DATA_PATH)
     write_json(user_json_data, USER_JSON_PATH)
 
     if draw_count == 1:
@@ -834,8 +739,6 @@ def cate():
 
 
 def history():
-    gacha_history_data = read_json(GACHA_HISTORY_PATH, encoding='utf-8')
-    gacha_table = get_memory("gacha_table")
     category = request.args.get("category")  # 卡池id
     
     # 使用传递的 gachaTs 作为时间基准；若没有传递，则使用当前时间
@@ -845,18 +748,11 @@ def history():
     request_pos_get = 0 if int(request.args.get("pos", 0)) == 0 else int(request.args.get("pos"))
     request_pos = request_pos_get - 1 if request_pos_get > 0 else 0
     
-    # 直接获取并排序 category 对应的记录列表
-    gacha_history_data[category].sort(key=lambda x: (abs(int(x["gachaTs"]) - ts), -x["pos"]))
-    
-    # 从 request_pos 开始获取 10 条数据
-    gacha_history_data_2 = gacha_history_data[category][request_pos:request_pos + 10]
+    # 按与 ts 的时间差排序后，从 request_pos 开始获取 10 条数据，并检查是否有更多符合条件的记录
+    gacha_history_data_2, has_more = history_store.page(category, ts, request_pos, 10)
     
     # 查找 category 对应的 gachaPoolName
-    pool_name = ""
-    for item in gacha_table["gachaPoolClient"]:
-        if item.get("gachaPoolId") == category:
-            pool_name = item.get("gachaPoolName", "")
-            break
+    pool_name = get_index("gachaPoolNames").get(category, "")
 
     # 动态生成 list_data
     list_data = []
@@ -871,9 +767,6 @@ def history():
             "gachaTs": info["gachaTs"],
             "pos": info["pos"]
         })
-    
-    # 检查是否有更多符合条件的记录，如果有更多数据则设置 hasMore 为 True
-    has_more = len(gacha_history_data[category]) > (request_pos + 10)
 
     result = {
         "code": 0,
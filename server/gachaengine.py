@@ -0,0 +1,151 @@
+import os
+import random
+import threading
+
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from utils import read_json
+
+
+class AliasTable:
+    '''
+    Walker/Vose 别名表：按整数权重构建一次，之后每次抽样 O(1)
+
+    :param items: 候选项
+    :param weights: 对应的权重，必须为非负数且总和大于0
+    '''
+
+    __slots__ = ("items", "weights", "prob", "alias")
+
+    def __init__(self, items: Sequence[Any], weights: Sequence[float]):
+        total = float(sum(weights))
+        if not items or len(items) != len(weights) or total <= 0:
+            raise ValueError("权重为空或总和不大于0")
+        n = len(items)
+        self.items = list(items)
+        self.weights = list(weights)
+        self.prob = [0.0] * n
+        self.alias = list(range(n))
+
+        scaled = [weight * n / total for weight in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # 浮点误差导致剩余的项概率视为1
+        for i in large + small:
+            self.prob[i] = 1.0
+
+    def sample(self, rng: random.Random = random) -> Any:
+        i = int(rng.random() * len(self.prob))
+        return self.items[i] if rng.random() < self.prob[i] else self.items[self.alias[i]]
+
+
+class CompiledPool:
+    '''
+    编译后的卡池：稀有度的基础权重与每个稀有度的角色别名表
+
+    :param pool_json: 卡池文件（data/gacha/*.json）或公开招募（normalGacha.json）的数据
+    :param percent_scale: totalPercent 转为整数权重时乘的系数（寻访为200，公开招募为100）
+    :param with_up: 是否给 UP 角色增加权重
+    :param six_star_only: 是否只保留六星
+    '''
+
+    def __init__(self, pool_json: Dict[str, Any], percent_scale: int, with_up: bool, six_star_only: bool):
+        avail_char_info = pool_json["detailInfo"]["availCharInfo"]["perAvailList"]
+        up_char_info = []
+        if with_up:
+            up_char_info = (pool_json["detailInfo"].get("upCharInfo") or {}).get("perCharList") or []
+
+        # [(稀有度, perAvailList 中的下标, 整数权重)]
+        self.ranks: List[Tuple[int, int, int]] = []
+        self.char_tables: Dict[int, AliasTable] = {}
+        for i, char_info in enumerate(avail_char_info):
+            rarity_rank = char_info["rarityRank"]
+            if six_star_only and rarity_rank != 5:
+                continue
+            self.ranks.append((rarity_rank, i, int(float(char_info["totalPercent"]) * percent_scale)))
+
+            # 每个角色权重为1，同稀有度的 UP 角色额外增加 percent * 100 - 15
+            weights: Dict[str, int] = {}
+            for char_id in char_info["charIdList"]:
+                weights[char_id] = weights.get(char_id, 0) + 1
+            for up_char in up_char_info:
+                if up_char["rarityRank"] == rarity_rank:
+                    extra = int(up_char["percent"] * 100) - 15
+                    for char_id in up_char["charIdList"]:
+                        weights[char_id] = weights.get(char_id, 0) + max(extra, 0)
+            if weights:
+                self.char_tables[i] = AliasTable(list(weights), list(weights.values()))
+
+        self._rank_tables: Dict[int, AliasTable] = {}
+        self._lock = threading.Lock()
+
+    def rank_table(self, six_star_bonus: int = 0) -> AliasTable:
+        '''稀有度的别名表，six_star_bonus 为六星额外增加的权重（寻访的保底机制），按不同的值分别缓存'''
+        table = self._rank_tables.get(six_star_bonus)
+        if table is None:
+            ranks = [(rarity_rank, i) for rarity_rank, i, _ in self.ranks]
+            weights = [
+                weight + (six_star_bonus if rarity_rank == 5 else 0)
+                for rarity_rank, _, weight in self.ranks
+            ]
+            table = AliasTable(ranks, weights)
+            with self._lock:
+                self._rank_tables[six_star_bonus] = table
+        return table
+
+    def draw(self, six_star_bonus: int = 0, rng: random.Random = random) -> Tuple[int, int, str]:
+        '''
+        抽取一次
+
+        :return: (稀有度, perAvailList 中的下标, 角色ID)
+        '''
+        rarity_rank, index = self.rank_table(six_star_bonus).sample(rng)
+        return rarity_rank, index, self.char_tables[index].sample(rng)
+
+
+def six_star_bonus(gacha_count: int) -> int:
+    '''寻访中六星的额外权重，随距离上次六星的次数每50次增加2'''
+    return (gacha_count + 50) // 50 * 2
+
+
+# (路径, 编译参数) -> ((mtime_ns, size), 编译后的卡池)
+_compiled: Dict[Tuple[str, Hashable], Tuple[Tuple[int, int], CompiledPool]] = {}
+_lock = threading.Lock()
+
+
+def get_compiled_pool(path: str, percent_scale: int, with_up: bool, six_star_only: bool,
+                      pool_json: Optional[Dict[str, Any]] = None) -> CompiledPool:
+    '''
+    获取编译后的卡池。按卡池文件与编译参数（包括 gacha 配置中的 sixStarOnly）缓存，
+    卡池文件被修改或配置变化后重新编译
+
+    :param path: 卡池文件路径
+    :param pool_json: 已解码的卡池数据（如卡池索引中的数据），为空时读取卡池文件
+    '''
+    st = os.stat(path)
+    stat = (st.st_mtime_ns, st.st_size)
+    key = (os.path.normpath(path), (percent_scale, with_up, six_star_only))
+    cached = _compiled.get(key)
+    if cached is not None and cached[0] == stat:
+        return cached[1]
+
+    pool = CompiledPool(pool_json if pool_json is not None else read_json(path), percent_scale, with_up, six_star_only)
+    with _lock:
+        _compiled[key] = (stat, pool)
+    return pool
+
+
+def clear_compiled_pools(path: Optional[str] = None):
+    with _lock:
+        if path is None:
+            _compiled.clear()
+        else:
+            for key in [key for key in _compiled if key[0] == os.path.normpath(path)]:
+                del _compiled[key]
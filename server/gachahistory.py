@@ -0,0 +1,195 @@
+import os
+import atexit
+import heapq
+import threading
+
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from msgspec import DecodeError
+
+from constants import GACHA_HISTORY_PATH
+from metrics import metrics, WRITES
+from utils import read_json_file, write_json_file, json_encoder, json_decoder
+
+
+class PoolHistory:
+    '''一个卡池的寻访记录，按 (gachaTs, pos) 升序保存，相同的 (gachaTs, pos) 只保留最后一条'''
+
+    __slots__ = ("keys", "records")
+
+    def __init__(self):
+        self.keys: List[Tuple[int, int]] = []
+        self.records: List[Dict[str, Any]] = []
+
+    def add(self, record: Dict[str, Any]):
+        key = (int(record["gachaTs"]), int(record["pos"]))
+        # 新的记录通常在末尾，bisect 只需 O(log n)
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            self.records[i] = record
+        else:
+            self.keys.insert(i, key)
+            self.records.insert(i, record)
+
+    # 排序键为 (与 ts 的时间差, -pos, -gachaTs)，时间差与 pos 都相同时较新的记录在前
+
+    def _before(self, ts: int) -> Iterator[Tuple[Tuple[int, int, int], Dict[str, Any]]]:
+        # gachaTs <= ts 的记录，从近到远，同一时间戳内 pos 从大到小
+        for i in range(bisect_right(self.keys, (ts, float("inf"))) - 1, -1, -1):
+            group_ts, pos = self.keys[i]
+            yield (ts - group_ts, -pos, -group_ts), self.records[i]
+
+    def _after(self, ts: int) -> Iterator[Tuple[Tuple[int, int, int], Dict[str, Any]]]:
+        # gachaTs > ts 的记录，从近到远，同一时间戳内 pos 从大到小
+        i = bisect_right(self.keys, (ts, float("inf")))
+        while i < len(self.keys):
+            group_ts = self.keys[i][0]
+            end = bisect_right(self.keys, (group_ts, float("inf")), i)
+            for j in range(end - 1, i - 1, -1):
+                yield (group_ts - ts, -self.keys[j][1], -group_ts), self.records[j]
+            i = end
+
+    def page(self, ts: int, offset: int, size: int) -> Tuple[List[Dict[str, Any]], bool]:
+        '''
+        按与 ts 的时间差从近到远（相同时按 pos 从大到小，再相同时较新的在前）排序后，返回从 offset 开始的 size 条记录。
+        与旧版对从新到旧保存的记录做稳定排序 sort(key=(abs(gachaTs - ts), -pos)) 的结果相同
+
+        两侧分别从 ts 向外遍历再归并，只需访问 offset + size 条记录
+
+        :return: (记录, 是否还有更多记录)
+        '''
+        merged = heapq.merge(self._before(ts), self._after(ts), key=lambda item: item[0])
+        items = [record for _, record in islice(merged, offset, offset + size + 1)]
+        return items[:size], len(items) > size
+
+
+class GachaHistoryStore:
+    '''
+    寻访记录存储。
+
+    启动后第一次使用时读取 gachaHistory.json 快照与同目录下的 "gachaHistory.json.journal" 日志，
+    之后每次寻访只把新的记录作为一行追加到日志，累计 checkpoint_interval 行后才重写一次快照。
+    日志被其他进程追加时只读取新增的部分，快照被外部修改（或由其他进程重写）时重新加载。
+
+    :param path: 快照文件路径
+    '''
+
+    def __init__(self, path: str = GACHA_HISTORY_PATH):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        # 日志累计多少行后重写快照（关闭时也会重写），小于等于0时从不重写（多个工作进程共用日志时）
+        self.checkpoint_interval = 1000
+        self._pools: Dict[str, PoolHistory] = {}
+        self._snapshot_stat: Optional[Tuple[int, int]] = None
+        self._offset = 0
+        self._records = 0
+        self._loaded = False
+        self._lock = threading.RLock()
+        atexit.register(self.close)
+
+    @staticmethod
+    def _stat(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _apply(self, pool_id: str, records: List[Dict[str, Any]]):
+        history = self._pools.get(pool_id)
+        if history is None:
+            history = self._pools[pool_id] = PoolHistory()
+        for record in records:
+            history.add(record)
+
+    def _reload(self):
+        self._pools = {}
+        self._snapshot_stat = self._stat(self.path)
+        if self._snapshot_stat is not None:
+            # 快照中每个卡池的记录为从新到旧
+            for pool_id, records in read_json_file(self.path).items():
+                self._apply(pool_id, reversed(records))
+        self._offset = 0
+        self._records = 0
+        self._loaded = True
+        self._read_journal()
+
+    def _read_journal(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        # 只处理完整的行，末尾未写完的行留到下次读取
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                entries = json_decoder.decode(line)
+            except DecodeError:
+                print(f"[GachaHistory] 忽略 {self.journal_path} 中损坏的记录")
+                continue
+            for pool_id, record in entries:
+                self._apply(pool_id, (record,))
+            self._records += 1
+        self._offset += end
+
+    def _refresh(self):
+        if not self._loaded or self._stat(self.path) != self._snapshot_stat:
+            self._reload()
+            return
+        journal_stat = self._stat(self.journal_path)
+        size = journal_stat[1] if journal_stat is not None else 0
+        if size < self._offset:
+            # 日志被清空，说明其他进程重写了快照
+            self._reload()
+        elif size > self._offset:
+            self._read_journal()
+
+    def append(self, pool_id: str, records: List[Dict[str, Any]]):
+        '''追加一次寻访的记录（一次写入），与已有记录的 gachaTs 和 pos 相同时覆盖'''
+        if not records:
+            return
+        with self._lock:
+            self._refresh()
+            line = json_encoder.encode([[pool_id, record] for record in records]) + b"\n"
+            with open(self.journal_path, "ab") as f:
+                f.write(line)
+            metrics.record_io(WRITES, 0, len(line))
+            # 从上次读取的位置读回，其他进程在此期间追加的记录也会一并读取
+            self._read_journal()
+            if 0 < self.checkpoint_interval <= self._records:
+                self.checkpoint()
+
+    def page(self, pool_id: str, ts: int, offset: int = 0, size: int = 10) -> Tuple[List[Dict[str, Any]], bool]:
+        '''返回卡池的一页记录，排序方式见 PoolHistory.page'''
+        with self._lock:
+            self._refresh()
+            history = self._pools.get(pool_id)
+            if history is None:
+                return [], False
+            return history.page(ts, offset, size)
+
+    def checkpoint(self):
+        '''把全部记录写入快照并清空日志'''
+        with self._lock:
+            if not self._loaded or not os.path.exists(self.journal_path):
+                return
+            self._refresh()
+            snapshot = {pool_id: history.records[::-1] for pool_id, history in self._pools.items()}
+            tmp_path = f"{self.path}.tmp"
+            write_json_file(snapshot, tmp_path)
+            os.replace(tmp_path, self.path)
+            # 快照已包含日志中的全部记录，即使在删除日志前崩溃，重放日志得到的结果也相同
+            os.remove(self.journal_path)
+            self._snapshot_stat = self._stat(self.path)
+            self._offset = 0
+            self._records = 0
+
+    def close(self):
+        if self.checkpoint_interval > 0:
+            self.checkpoint()
+
+
+history_store = GachaHistoryStore()
@@ -0,0 +1,114 @@
+import os
+import threading
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from constants import GACHA_POOL_DIR
+from utils import read_json_file, json_encoder
+
+# 卡池ID前缀 -> 保底次数的类型，其他卡池以卡池ID作为类型
+POOL_TYPE_PREFIXES = ("NORM", "BOOT", "CLASSIC")
+DEFAULT_POOL_ID = "DEFAULT"
+
+
+def pool_type(pool_id: str) -> str:
+    '''返回卡池的保底次数类型（serverData.json 中 gacha.count 的键）'''
+    return next((prefix for prefix in POOL_TYPE_PREFIXES if pool_id.startswith(prefix)), pool_id)
+
+
+class PoolEntry:
+    '''
+    一个卡池文件：解码后的数据与编码后的响应，在文件被修改后重新加载
+
+    :param pool_id: 卡池ID（文件名）
+    :param path: 卡池文件路径
+    '''
+
+    __slots__ = ("pool_id", "path", "stat", "pool", "body")
+
+    def __init__(self, pool_id: str, path: str):
+        self.pool_id = pool_id
+        self.path = path
+        self.stat: Optional[Tuple[int, int]] = None
+        self.pool: Any = None
+        self.body: Optional[bytes] = None
+
+    def load(self, stat: Tuple[int, int]):
+        pool = read_json_file(self.path)
+        self.pool, self.body, self.stat = pool, json_encoder.encode(pool), stat
+
+
+class PoolRegistry:
+    '''
+    data/gacha 下卡池文件的索引，按卡池ID与保底次数类型查找。
+
+    目录只在其修改时间变化（增删文件）后重新扫描，卡池文件在第一次使用时解码，
+    之后每次使用只比对文件的修改时间与大小。
+    '''
+
+    def __init__(self, directory: str = GACHA_POOL_DIR):
+        self.directory = directory
+        self._dir_mtime: Optional[int] = None
+        self._entries: Dict[str, PoolEntry] = {}
+        self._by_type: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        mtime = os.stat(self.directory).st_mtime_ns
+        if mtime == self._dir_mtime:
+            return
+        with self._lock:
+            if mtime == self._dir_mtime:
+                return
+            entries: Dict[str, PoolEntry] = {}
+            by_type: Dict[str, List[str]] = {}
+            for name in sorted(os.listdir(self.directory)):
+                pool_id, ext = os.path.splitext(name)
+                if ext != ".json":
+                    continue
+                # 保留已加载的卡池，文件是否变化由 get 比对
+                entries[pool_id] = self._entries.get(pool_id) or PoolEntry(pool_id, os.path.join(self.directory, name))
+                by_type.setdefault(pool_type(pool_id), []).append(pool_id)
+            self._entries, self._by_type, self._dir_mtime = entries, by_type, mtime
+
+    def get(self, pool_id: str) -> Optional[PoolEntry]:
+        '''获取卡池，不存在时返回 None'''
+        self._scan()
+        entry = self._entries.get(pool_id)
+        if entry is None:
+            return None
+        try:
+            st = os.stat(entry.path)
+        except FileNotFoundError:
+            return None
+        stat = (st.st_mtime_ns, st.st_size)
+        if entry.stat != stat:
+            with self._lock:
+                if entry.stat != stat:
+                    entry.load(stat)
+        return entry
+
+    def get_or_default(self, pool_id: str) -> Optional[PoolEntry]:
+        '''获取卡池，不存在时返回 DEFAULT 卡池'''
+        return self.get(pool_id) or self.get(DEFAULT_POOL_ID)
+
+    def pool_ids(self, gacha_type: Optional[str] = None) -> List[str]:
+        '''返回全部卡池ID，gacha_type 不为空时只返回该保底次数类型的卡池'''
+        self._scan()
+        if gacha_type is None:
+            return list(self._entries)
+        return list(self._by_type.get(gacha_type, ()))
+
+    def warm(self) -> int:
+        '''加载全部卡池（在多进程服务器的主进程中调用，工作进程共享已加载的数据）'''
+        count = 0
+        for pool_id in self.pool_ids():
+            try:
+                if self.get(pool_id) is not None:
+                    count += 1
+            except Exception as e:
+                print(f"加载卡池 {pool_id} 时出错: {str(e)}")
+        return count
+
+
+pool_registry = PoolRegistry()
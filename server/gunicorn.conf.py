@@ -0,0 +1,25 @@
+# gunicorn 配置，工作进程与线程数读取 config.json 中的 serverWorkers / serverThreads
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__))))
+
+from configstore import config_store
+
+server_config = config_store.get()["server"]
+
+bind = f'{server_config["host"]}:{server_config["port"]}'
+workers = server_config.get("serverWorkers", 1)
+threads = server_config.get("serverThreads", 8)
+worker_class = "gthread"
+# 先在主进程中导入 wsgi.py 加载表，再 fork 工作进程；关闭时每个工作进程各自加载一份
+preload_app = server_config.get("preloadInMaster", True)
+
+
+def post_fork(server, worker):
+    # 事件循环与写回线程不会随 fork 复制，在每个工作进程中重新启动
+    import utils
+    from app import start_background_tasks
+
+    utils.global_loop = None
+    start_background_tasks(workers)
@@ -0,0 +1,131 @@
+import os
+
+from typing import Any, Dict, List, Tuple
+
+from msgspec.json import Encoder, Decoder
+from msgspec import DecodeError
+
+from metrics import metrics, WRITES
+
+json_encoder = Encoder()
+json_decoder = Decoder(strict=False)
+
+# 差异比较的深度，如 user.json 中 ("user", "troop", "chars", "1") 为一条记录
+DIFF_DEPTH = 4
+
+
+def flatten(doc: Any, depth: int = DIFF_DEPTH) -> Dict[Tuple[str, ...], bytes]:
+    '''
+    把文档按深度展开为 {路径: 编码后的值}，用于比较两次写入之间的差异
+
+    :param doc: 要展开的文档
+    :param depth: 展开深度，超过该深度的子树整体作为一个值
+    '''
+    result = {}
+    stack = [((), doc, depth)]
+    while stack:
+        prefix, node, left = stack.pop()
+        if left and isinstance(node, dict) and node:
+            for key, value in node.items():
+                stack.append((prefix + (str(key),), value, left - 1))
+        else:
+            result[prefix] = json_encoder.encode(node)
+    return result
+
+
+def diff(old: Dict[Tuple[str, ...], bytes], new: Dict[Tuple[str, ...], bytes]) -> List[list]:
+    '''
+    比较两次展开结果，返回补丁操作列表，删除操作在前
+
+    整个子树被删除时只在新文档中已不存在的最上层路径生成一条删除操作，避免重放后留下空的父节点
+
+    :return: [["del", path], ..., ["set", path, value], ...]，value 为原始 JSON 字节
+    '''
+    removed = old.keys() - new.keys()
+    ops = []
+    if removed:
+        # 新文档中仍然存在的全部路径前缀
+        prefixes = {path[:i] for path in new for i in range(len(path) + 1)}
+        deleted = set()
+        for path in sorted(removed, key=len):
+            # 原来的空对象变为有子节点时路径仍然存在，由后面的设置操作覆盖
+            top = next((path[:i] for i in range(1, len(path) + 1) if path[:i] not in prefixes), None)
+            if top is not None and top not in deleted:
+                deleted.add(top)
+                ops.append(["del", list(top)])
+    for path, value in new.items():
+        if old.get(path) != value:
+            ops.append(["set", list(path), value])
+    return ops
+
+
+def apply(doc: Any, ops: List[list]) -> Any:
+    '''把补丁操作应用到文档上，返回应用后的文档（根路径被替换时为新对象）'''
+    for op in ops:
+        path = op[1]
+        if not path:
+            doc = op[2] if op[0] == "set" else {}
+            continue
+        node = doc
+        for key in path[:-1]:
+            child = node.get(key)
+            if not isinstance(child, dict):
+                if op[0] == "del":
+                    break
+                child = node[key] = {}
+            node = child
+        else:
+            if op[0] == "set":
+                node[path[-1]] = op[2]
+            else:
+                node.pop(path[-1], None)
+    return doc
+
+
+class Journal:
+    '''
+    只追加的修改日志，每行为一次写入产生的补丁
+
+    :param path: 快照文件路径，日志保存在同目录下的 "<文件名>.journal"
+    '''
+
+    def __init__(self, path: str):
+        self.path = f"{path}.journal"
+        self.records = 0
+
+    def append(self, ops: List[list]):
+        # 值已经是编码后的 JSON，这里手动拼接避免二次编码
+        parts = []
+        for op in ops:
+            if op[0] == "set":
+                parts.append(b'["set",' + json_encoder.encode(op[1]) + b',' + op[2] + b']')
+            else:
+                parts.append(b'["del",' + json_encoder.encode(op[1]) + b']')
+        line = b"[" + b",".join(parts) + b"]\n"
+        with open(self.path, "ab") as f:
+            f.write(line)
+        # 调用次数已由 write_json 记录，这里只记录字节数
+        metrics.record_io(WRITES, 0, len(line))
+        self.records += 1
+
+    def replay(self, doc: Any) -> Any:
+        '''把日志中的全部补丁应用到快照上，末尾不完整的记录（写入时崩溃）会被忽略'''
+        self.records = 0
+        if not os.path.exists(self.path):
+            return doc
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    ops = json_decoder.decode(line)
+                except DecodeError:
+                    print(f"[Journal] 忽略 {self.path} 中损坏的记录")
+                    continue
+                doc = apply(doc, ops)
+                self.records += 1
+        return doc
+
+    def reset(self):
+        '''快照写入完成后清空日志'''
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.records = 0
@@ -0,0 +1,44 @@
+from typing import Any, Optional
+
+from flask import Response
+from flask.json.provider import JSONProvider, _default
+from msgspec.json import Encoder, Decoder, format
+
+
+class MsgspecJSONProvider(JSONProvider):
+    '''
+    使用 msgspec 编码视图函数返回的 dict/list，替代 Flask 默认基于标准库 json 的实现。
+
+    支持 msgspec.Raw：预先编码好的片段会原样拼接到响应中。
+    msgspec 不支持的类型（Decimal 等）按 Flask 的默认规则转换。
+
+    :param compact: 为 False 时输出带缩进的 JSON；为 None 时与 Flask 一致，仅在调试模式下缩进
+    '''
+
+    mimetype = "application/json"
+    compact: Optional[bool] = None
+
+    def __init__(self, app, compact: Optional[bool] = None):
+        super().__init__(app)
+        self.compact = compact
+        self._encoder = Encoder(enc_hook=_default)
+        self._decoder = Decoder(strict=False)
+
+    def encode(self, obj: Any) -> bytes:
+        return self._encoder.encode(obj)
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        body = self._encoder.encode(obj)
+        if kwargs.get("indent"):
+            body = format(body, indent=kwargs["indent"])
+        return body.decode("utf-8")
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return self._decoder.decode(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        body = self._encoder.encode(obj)
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            body = format(body, indent=2)
+        return self._app.response_class(body, mimetype=self.mimetype)
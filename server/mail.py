@@ -4,6 +4,7 @@ from flask import request
 
 from constants import MAILLIST_PATH, MAILCOLLECTION_PATH
 from utils import read_json, write_json
+from responsecache import file_response
 
 
 # 获取邮件列表的元信息
@@ -235,6 +236,4 @@ def mailRemoveAllReceivedMail():
 
 def mailCollectionGetList():
 
-    mailcollect_data = read_json(MAILCOLLECTION_PATH)
-
-    return mailcollect_data
\ No newline at end of file
+    return file_response("mailCollection", MAILCOLLECTION_PATH)
\ No newline at end of file
@@ -0,0 +1,112 @@
+import os
+import sys
+
+from typing import Any, Dict, List, Optional
+
+# smaps_rollup 中需要的字段（单位 kB）
+_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty", "Swap")
+
+
+def read_smaps_rollup(pid: int) -> Optional[Dict[str, int]]:
+    '''
+    读取 /proc/<pid>/smaps_rollup（Linux 4.14+）
+
+    :return: 字段 -> 字节数，不支持或进程不存在时返回 None
+    '''
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    values = {}
+    for line in lines[1:]:
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].rstrip(":") in _FIELDS:
+            values[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return values
+
+
+def _cmdline(pid: int) -> Optional[bytes]:
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _ppid(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # 进程名可能包含空格，ppid 在最后一个右括号之后的第二个字段
+            return int(f.read().rsplit(")", 1)[1].split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _children(pid: int) -> List[int]:
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return []
+    return sorted(int(entry) for entry in entries if entry.isdigit() and _ppid(int(entry)) == pid)
+
+
+def supported() -> bool:
+    '''是否可以读取 /proc（Windows 与 macOS 上不支持）'''
+    return os.path.isdir("/proc")
+
+
+def server_pids(pid: Optional[int] = None) -> List[int]:
+    '''
+    返回服务端的全部进程：pid 所在的进程，以及命令行相同的父进程（gunicorn 主进程）与兄弟进程（其他工作进程）。
+    无法读取 /proc 时返回空列表
+    '''
+    pid = pid or os.getpid()
+    cmdline = _cmdline(pid)
+    parent = _ppid(pid)
+    if cmdline is None or parent is None:
+        return []
+    if _cmdline(parent) != cmdline:
+        return [pid] + [child for child in _children(pid) if _cmdline(child) == cmdline]
+    return [parent] + [child for child in _children(parent) if _cmdline(child) == cmdline]
+
+
+def memory_report(pids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    '''
+    每个进程的内存占用（字节）：unique 为进程独占的内存（USS），shared 为与其他进程共享的页，
+    pss 为按共享进程数平摊后的占用，多个工作进程的 pss 之和即服务端实际占用的内存
+    '''
+    report = []
+    for pid in server_pids() if pids is None else pids:
+        values = read_smaps_rollup(pid)
+        if values is None:
+            continue
+        report.append({
+            "pid": pid,
+            "rss": values.get("Rss", 0),
+            "pss": values.get("Pss", 0),
+            "unique": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+            "shared": values.get("Shared_Clean", 0) + values.get("Shared_Dirty", 0),
+            "swap": values.get("Swap", 0)
+        })
+    return report
+
+
+def format_memory_report(report: List[Dict[str, Any]]) -> str:
+    lines = [f"{'pid':>8}{'rss(MB)':>10}{'unique(MB)':>12}{'shared(MB)':>12}{'pss(MB)':>10}"]
+    for item in report:
+        lines.append(
+            f"{item['pid']:>8}{item['rss'] / 1048576:>10.1f}{item['unique'] / 1048576:>12.1f}"
+            f"{item['shared'] / 1048576:>12.1f}{item['pss'] / 1048576:>10.1f}"
+        )
+    total_pss = sum(item["pss"] for item in report)
+    lines.append(f"共 {len(report)} 个进程，PSS 合计 {total_pss / 1048576:.1f}MB")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # python server/memreport.py <gunicorn 主进程或任一工作进程的 pid>
+    if len(sys.argv) < 2:
+        print("用法: python server/memreport.py <pid>")
+        sys.exit(1)
+    print(format_memory_report(memory_report(server_pids(int(sys.argv[1])))))
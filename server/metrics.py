@@ -0,0 +1,149 @@
+import threading
+
+from bisect import bisect_left
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+from flask import Response, g, has_request_context, request
+
+# 延迟直方图的桶（秒）
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = "doctorate"
+
+# 计数器在 _RuleMetrics.io 中的下标
+READS, READ_BYTES, WRITES, WRITE_BYTES = range(4)
+
+
+class _RuleMetrics:
+    __slots__ = ("buckets", "count", "sum", "errors", "request_bytes", "response_bytes", "io")
+
+    def __init__(self):
+        # 每个桶单独计数，输出时再累加
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.io = [0, 0, 0, 0]
+
+
+class Metrics:
+    '''
+    按 URL 规则统计请求耗时、请求/响应大小、错误数以及 read_json/write_json 的调用次数和字节数，
+    以 Prometheus 文本格式输出。
+    不在请求中发生的读写（如 PlayerStore 的后台写回）记在规则 "-" 下
+    '''
+
+    def __init__(self):
+        self._rules: Dict[Tuple[str, str], _RuleMetrics] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: Tuple[str, str]) -> _RuleMetrics:
+        rule = self._rules.get(key)
+        if rule is None:
+            rule = self._rules.setdefault(key, _RuleMetrics())
+        return rule
+
+    def record_io(self, kind: int, calls: int = 1, nbytes: int = 0):
+        '''
+        记录读写
+
+        :param kind: READS 或 WRITES
+        :param calls: 调用次数
+        :param nbytes: 实际读写磁盘的字节数（PlayerStore 命中内存时为0）
+        '''
+        if has_request_context() and "metrics_io" in g:
+            io = g.metrics_io
+            io[kind] += calls
+            io[kind + 1] += nbytes
+            return
+        with self._lock:
+            io = self._get(("-", "-")).io
+            io[kind] += calls
+            io[kind + 1] += nbytes
+
+    def before_request(self):
+        g.metrics_start = perf_counter()
+        g.metrics_io = [0, 0, 0, 0]
+
+    def after_request(self, response: Response) -> Response:
+        g.metrics_status = response.status_code
+        if not response.is_streamed:
+            g.metrics_response_bytes = response.calculate_content_length() or 0
+        return response
+
+    def teardown_request(self, exc: Optional[BaseException] = None):
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return
+        elapsed = perf_counter() - start
+        status = 500 if exc is not None else g.get("metrics_status", 500)
+        rule = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        io = g.get("metrics_io", (0, 0, 0, 0))
+        with self._lock:
+            metrics = self._get((rule, request.method))
+            metrics.buckets[bisect_left(BUCKETS, elapsed)] += 1
+            metrics.count += 1
+            metrics.sum += elapsed
+            if status >= 500:
+                metrics.errors += 1
+            metrics.request_bytes += request.content_length or 0
+            metrics.response_bytes += g.get("metrics_response_bytes", 0)
+            for i, value in enumerate(io):
+                metrics.io[i] += value
+
+    def render(self) -> str:
+        '''Prometheus 文本格式'''
+        with self._lock:
+            rules = sorted(self._rules.items())
+            snapshot = [
+                (key, list(m.buckets), m.count, m.sum, m.errors, m.request_bytes, m.response_bytes, list(m.io))
+                for key, m in rules
+            ]
+
+        lines: List[str] = []
+
+        def header(name: str, kind: str, text: str):
+            lines.append(f"# HELP {PREFIX}_{name} {text}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+        def labels(key: Tuple[str, str]) -> str:
+            rule = key[0].replace("\\", "\\\\").replace('"', '\\"')
+            return f'rule="{rule}",method="{key[1]}"'
+
+        header("request_duration_seconds", "histogram", "Request latency by URL rule")
+        for key, buckets, count, total, *_ in snapshot:
+            if key[0] == "-":
+                continue
+            cumulative = 0
+            for bound, value in zip(BUCKETS, buckets):
+                cumulative += value
+                lines.append(f'{PREFIX}_request_duration_seconds_bucket{{{labels(key)},le="{bound}"}} {cumulative}')
+            lines.append(f'{PREFIX}_request_duration_seconds_bucket{{{labels(key)},le="+Inf"}} {count}')
+            lines.append(f"{PREFIX}_request_duration_seconds_sum{{{labels(key)}}} {total}")
+            lines.append(f"{PREFIX}_request_duration_seconds_count{{{labels(key)}}} {count}")
+
+        counters = (
+            ("request_errors_total", "Responses with status >= 500", lambda item: item[4]),
+            ("request_bytes_total", "Request body bytes", lambda item: item[5]),
+            ("response_bytes_total", "Response body bytes (after compression)", lambda item: item[6]),
+            ("json_reads_total", "read_json calls", lambda item: item[7][READS]),
+            ("json_read_bytes_total", "Bytes read from disk by read_json", lambda item: item[7][READ_BYTES]),
+            ("json_writes_total", "write_json calls", lambda item: item[7][WRITES]),
+            ("json_write_bytes_total", "Bytes written to disk by write_json, player journals and the gacha history journal", lambda item: item[7][WRITE_BYTES]),
+        )
+        for name, text, value in counters:
+            header(name, "counter", text)
+            for item in snapshot:
+                if item[0][0] == "-" and not name.startswith("json_"):
+                    continue
+                lines.append(f"{PREFIX}_{name}{{{labels(item[0])}}} {value(item)}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._rules.clear()
+
+
+metrics = Metrics()
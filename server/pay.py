@@ -1,6 +1,7 @@
 from flask import request
 from virtualtime import time
 from utils import read_json, write_json
+from responsecache import file_response
 from admin.GiveItem import GiveItem
 import json
 
@@ -21,10 +22,7 @@ def GetUnconfirmedOrderIdList():
 
 def getAllProductList():
 
-    data = request.data
-    data = read_json(ALLPRODUCTLIST_PATH)
-
-    return data
+    return file_response("allProductList", ALLPRODUCTLIST_PATH)
 
 def getcreateOrder():
 
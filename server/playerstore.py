@@ -0,0 +1,194 @@
+import os
+import sys
+import atexit
+import threading
+import traceback
+
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from journal import Journal, flatten, diff, json_encoder, json_decoder
+
+
+class PlayerStore:
+    '''
+    常驻内存的玩家数据存储。
+
+    被管理的文件（如 user.json）只在第一次读取时从磁盘加载一次，内存中保存编码后的数据，
+    每次 read_json 都从中解码出一份新的对象，调用方可以随意修改而不影响保存的数据。
+    write_json 在调用时编码保存一份快照并标记为脏数据，由后台线程按间隔或在退出时统一写回磁盘，
+    写回线程只读取这份快照，不会读到请求线程修改到一半的对象。
+    启用日志模式后，写回时只把与上次写回的差异追加到日志，完整快照仅在检查点时重写。
+
+    :param loader: 从磁盘读取文件的函数，loader(path) -> data
+    :param dumper: 写入磁盘的函数，dumper(data, path)
+    :param paths: 需要托管的文件路径
+    '''
+
+    def __init__(self, loader: Callable[[str], Any], dumper: Callable[[Any, str], None], paths: Iterable[str] = ()):
+        self._loader = loader
+        self._dumper = dumper
+        self._paths: Set[str] = {os.path.normpath(path) for path in paths}
+        # 文件 -> 编码后的数据（只在 put 或重新加载时整体替换）
+        self._docs: Dict[str, bytes] = {}
+        # 记录最后一次读/写时文件的 (mtime_ns, size)，用于发现外部修改
+        self._stats: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._dirty: Set[str] = set()
+        self._lock = threading.RLock()
+        self._enabled = False
+        self._flush_interval = 0.0
+        self._flusher: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        # 日志模式
+        self._checkpoint_interval = 0
+        self._journals: Dict[str, Journal] = {}
+        self._baselines: Dict[str, Dict[Tuple[str, ...], bytes]] = {}
+        # 从磁盘加载的次数，外部修改导致重新加载时也会递增
+        self.loads = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    def manages(self, path: str) -> bool:
+        return self._enabled and os.path.normpath(path) in self._paths
+
+    def start(self, flush_interval: float = 0, journal: bool = False, checkpoint_interval: int = 200):
+        '''
+        启用存储
+
+        :param flush_interval: 写回间隔（秒），小于等于0时每次 write_json 立即写盘
+        :param journal: 是否启用日志模式
+        :param checkpoint_interval: 日志模式下每个文件累计多少条日志后重写一次完整快照
+        '''
+        with self._lock:
+            self._enabled = True
+            self._flush_interval = max(float(flush_interval), 0.0)
+            if journal:
+                self._checkpoint_interval = max(int(checkpoint_interval), 1)
+                self._journals = {key: Journal(key) for key in self._paths}
+        atexit.register(self.close)
+        if self._flush_interval > 0 and self._flusher is None:
+            self._stop_event.clear()
+            self._flusher = threading.Thread(target=self._flush_loop, name="PlayerStoreFlusher", daemon=True)
+            self._flusher.start()
+
+    def close(self):
+        '''停止后台写回线程并把所有脏数据写回磁盘'''
+        self._stop_event.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join(timeout=5)
+        self._flusher = None
+        self.flush()
+        self.checkpoint()
+
+    def get(self, path: str) -> Any:
+        '''返回 path 对应数据的一份副本，修改后需调用 put 保存'''
+        key = os.path.normpath(path)
+        with self._lock:
+            raw = self._docs[key] if self._fresh(key) else self._load(path, key)
+        return json_decoder.decode(raw)
+
+    def refresh(self, path: str):
+        '''只检查文件状态，文件被外部修改过或尚未加载时重新加载（loads 递增），不解码数据'''
+        key = os.path.normpath(path)
+        with self._lock:
+            if not self._fresh(key):
+                self._load(path, key)
+
+    def _fresh(self, key: str) -> bool:
+        # 未写回的数据以内存为准；否则文件被外部修改过（如手动编辑 user.json）时需要重新加载
+        return key in self._docs and (key in self._dirty or self._stats.get(key) == self._stat(key))
+
+    def _load(self, path: str, key: str) -> bytes:
+        data = self._loader(path)
+        self.loads += 1
+        self._stats[key] = self._stat(key)
+        if journal := self._journals.get(key):
+            data = journal.replay(data)
+            self._baselines[key] = flatten(data)
+        raw = self._docs[key] = json_encoder.encode(data)
+        return raw
+
+    def put(self, path: str, data: Any):
+        '''保存 data 的快照并标记为脏数据，之后对 data 的修改不会影响保存的数据'''
+        key = os.path.normpath(path)
+        # 在调用方的线程中编码，data 属于调用方，不会被其他线程同时修改
+        raw = json_encoder.encode(data)
+        with self._lock:
+            self._docs[key] = raw
+            self._dirty.add(key)
+            if self._flush_interval <= 0:
+                self._flush_one(key)
+
+    def flush(self, path: Optional[str] = None):
+        '''立即写回脏数据，path 为空时写回全部'''
+        with self._lock:
+            keys = [os.path.normpath(path)] if path is not None else list(self._dirty)
+            for key in keys:
+                if key in self._dirty:
+                    self._flush_one(key)
+
+    def invalidate(self, path: Optional[str] = None):
+        '''丢弃内存中的数据（脏数据会先写回），下次读取时重新从磁盘加载'''
+        with self._lock:
+            self.flush(path)
+            if path is None:
+                self._docs.clear()
+                self._stats.clear()
+            else:
+                key = os.path.normpath(path)
+                self._docs.pop(key, None)
+                self._stats.pop(key, None)
+
+    def checkpoint(self, path: Optional[str] = None):
+        '''日志模式下重写完整快照并清空日志，path 为空时处理全部文件'''
+        with self._lock:
+            keys = [os.path.normpath(path)] if path is not None else list(self._journals)
+            for key in keys:
+                journal = self._journals.get(key)
+                if journal is None or key not in self._docs:
+                    continue
+                if journal.records or key in self._dirty:
+                    self._dirty.discard(key)
+                    self._write_snapshot(key)
+
+    def _flush_one(self, key: str):
+        journal = self._journals.get(key)
+        self._dirty.discard(key)
+        if journal is None or key not in self._baselines:
+            self._write_snapshot(key)
+            return
+        current = flatten(json_decoder.decode(self._docs[key]))
+        ops = diff(self._baselines[key], current)
+        self._baselines[key] = current
+        if ops:
+            journal.append(ops)
+        if journal.records >= self._checkpoint_interval:
+            self._write_snapshot(key)
+
+    def _write_snapshot(self, key: str):
+        data = json_decoder.decode(self._docs[key])
+        tmp_path = f"{key}.tmp"
+        self._dumper(data, tmp_path)
+        os.replace(tmp_path, key)
+        self._stats[key] = self._stat(key)
+        if journal := self._journals.get(key):
+            # 快照已包含日志中的全部修改，即使在清空日志前崩溃，重放日志得到的结果也相同
+            journal.reset()
+            self._baselines[key] = flatten(data)
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self._flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[PlayerStore] 写回失败: {e}", file=sys.stderr)
+                print(traceback.format_exc(), file=sys.stderr)
+
+    @staticmethod
+    def _stat(key: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(key)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
@@ -0,0 +1,86 @@
+import sys
+import threading
+
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from time import perf_counter
+from typing import Any, Deque, Dict, List, Optional
+
+# 最近完成的性能记录（环形缓冲区）
+_history: Deque[Dict[str, Any]] = deque(maxlen=100)
+_lock = threading.Lock()
+
+
+class Profile:
+    '''
+    记录一次调用中各阶段的耗时与内存块分配数
+
+    两种用法可以混用::
+
+        profile = Profile("syncData")
+        with profile.span("roster"):
+            ...
+        profile.lap("stages")   # 记录从上一个阶段结束到现在的耗时
+        profile.finish()
+
+    分配数为 sys.getallocatedblocks() 的差值，即该阶段结束时净增加的内存块数量。
+    '''
+
+    def __init__(self, name: str):
+        self.name = name
+        self.spans: List[Dict[str, Any]] = []
+        self._start = perf_counter()
+        self._blocks = sys.getallocatedblocks()
+        self._last = self._start
+        self._last_blocks = self._blocks
+
+    def lap(self, name: str):
+        now = perf_counter()
+        blocks = sys.getallocatedblocks()
+        self.spans.append({"name": name, "time": now - self._last, "blocks": blocks - self._last_blocks})
+        self._last = now
+        self._last_blocks = blocks
+
+    @contextmanager
+    def span(self, name: str):
+        start = perf_counter()
+        blocks = sys.getallocatedblocks()
+        try:
+            yield
+        finally:
+            self._last = perf_counter()
+            self._last_blocks = sys.getallocatedblocks()
+            self.spans.append({"name": name, "time": self._last - start, "blocks": self._last_blocks - blocks})
+
+    def finish(self, log: bool = False) -> Dict[str, Any]:
+        '''结束记录并放入环形缓冲区，log 为 True 时输出一行摘要'''
+        record = {
+            "name": self.name,
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            "time": perf_counter() - self._start,
+            "blocks": sys.getallocatedblocks() - self._blocks,
+            "spans": self.spans
+        }
+        with _lock:
+            _history.append(record)
+        if log:
+            print(format_profile(record))
+        return record
+
+
+def format_profile(record: Dict[str, Any]) -> str:
+    spans = " ".join(f"{span['name']}={span['time'] * 1000:.1f}ms" for span in record["spans"])
+    return f"{record['name']}耗时: {record['time']:.3f}s [{spans}]"
+
+
+def get_profiles(name: Optional[str] = None) -> List[Dict[str, Any]]:
+    '''返回环形缓冲区中的记录，name 不为空时只返回同名记录'''
+    with _lock:
+        return [record for record in _history if name is None or record["name"] == name]
+
+
+def set_history_size(size: int):
+    global _history
+    with _lock:
+        _history = deque(_history, maxlen=max(int(size), 1))
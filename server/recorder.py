@@ -0,0 +1,35 @@
+import json
+import threading
+
+from flask import request
+
+from configstore import config_store
+
+_lock = threading.Lock()
+# 不需要记录的请求头
+_SKIPPED_HEADERS = {"host", "content-length", "connection", "accept-encoding"}
+
+
+def record_request():
+    '''
+    before_request：配置了 recordRequestsPath 时把请求追加到该 JSONL 文件，供 benchmark.py 回放。
+    每行形如 {"method": "POST", "path": "/account/syncData", "body": {...}, "headers": {...}}
+    '''
+    path = config_store.server().get("recordRequestsPath", "")
+    if not path or request.path == "/metrics":
+        return
+
+    data = request.get_data(cache=True)
+    try:
+        body = json.loads(data) if data else None
+    except ValueError:
+        body = data.decode("utf-8", errors="replace")
+    line = json.dumps({
+        "method": request.method,
+        "path": request.full_path.rstrip("?"),
+        "body": body,
+        "headers": {key: value for key, value in request.headers.items() if key.lower() not in _SKIPPED_HEADERS}
+    }, ensure_ascii=False)
+    with _lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
@@ -0,0 +1,90 @@
+import os
+import threading
+
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from flask import Response, g
+
+from configstore import config_store
+from utils import read_json, json_encoder
+
+
+class ResponseCache:
+    '''
+    按版本戳缓存编码后的响应。
+
+    调用方负责生成版本戳（玩家数据、表与配置的版本等），版本戳与缓存时一致才返回缓存的字节，
+    每个 key 只保留最后一次的响应。压缩后的响应与原响应一起缓存，原响应被替换时一起失效。
+    '''
+
+    def __init__(self):
+        # key -> (版本戳, 响应, 压缩方式 -> 压缩后的响应)
+        self._entries: Dict[str, Tuple[Hashable, bytes, Dict[str, bytes]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, stamp: Hashable) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, stamp: Hashable, body: bytes):
+        with self._lock:
+            self._entries[key] = (stamp, body, {})
+
+    def get_compressed(self, key: str, stamp: Hashable, encoding: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                return entry[2].get(encoding)
+            return None
+
+    def put_compressed(self, key: str, stamp: Hashable, encoding: str, body: bytes):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                entry[2][encoding] = body
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": {
+                    key: {"size": len(body), "compressed": {name: len(data) for name, data in compressed.items()}}
+                    for key, (_, body, compressed) in self._entries.items()
+                }
+            }
+
+
+response_cache = ResponseCache()
+
+
+def file_response(key: str, path: str):
+    '''
+    直接返回 JSON 文件内容的接口（如危机合约、商品列表）使用：开启 syncDataResponseCache 时
+    按文件的修改时间与大小缓存编码后的响应，未开启时与 read_json 相同
+
+    :param key: 缓存的 key，每个接口使用不同的 key
+    :param path: 文件路径
+    '''
+    if not config_store.server().get("syncDataResponseCache", False):
+        return read_json(path)
+    st = os.stat(path)
+    stamp = (path, st.st_mtime_ns, st.st_size)
+    body = response_cache.get(key, stamp)
+    if body is None:
+        body = json_encoder.encode(read_json(path))
+        response_cache.put(key, stamp, body)
+    # 压缩时使用缓存的压缩结果
+    g.response_cache_key = (key, stamp)
+    return Response(body, mimetype="application/json")
@@ -3,9 +3,8 @@ from random import choice, choices
 
 from constants import USER_JSON_PATH, RLV2_TEMPBUFF_JSON_PATH, RLV2_NODESINFO, RLV2_CONFIG_PATH
 from utils import read_json, get_memory
+from tableindex import get_index
 
-RL_TABLE = get_memory("roguelike_topic_table")
-CHARACTER_TABLE = get_memory("character_table")
 
 POPULATION_RECRUIT_MAP = {
     "0": 0,
@@ -47,7 +46,7 @@ def process_buff(rl_data: dict, buff_data: dict):
 
 def process_relic(rl_data: dict, relics: list):
 
-    relic_dict = RL_TABLE["details"]["rogue_1"]["relics"]
+    relic_dict = get_memory("roguelike_topic_table")["details"]["rogue_1"]["relics"]
 
     for relic_item in relics:
         
@@ -159,26 +158,31 @@ def generate_recruit_list(rl_data: dict, recruit_ticket_key: str):
         else:
             recruited_dict[recruit_data["result"]["charId"]] += 1
     
-    recruit_ticket_details = RL_TABLE["details"]["rogue_1"]["recruitTickets"][recruit_ticket_key]
+    recruit_ticket_details = get_memory("roguelike_topic_table")["details"]["rogue_1"]["recruitTickets"][recruit_ticket_key]
     free_char_indexes = []
 
-    for characterKey in CHARACTER_TABLE:
-        if "char" not in characterKey:
-            continue
-
-        character = CHARACTER_TABLE[characterKey]
-
-        if not (
-            character["profession"] in recruit_ticket_details["professionList"] and 
-            character["rarity"] in recruit_ticket_details["rarityList"]
-        ) and not characterKey in recruit_ticket_details["extraCharIds"]:
-            continue
-
-        userChar = None
-        for userCharNum in user_data:
-            if user_data[userCharNum]["charId"] == characterKey:
-                userChar = user_data[userCharNum]
-                break
+    # 按职业与稀有度取出候选角色，保持角色表中的顺序；角色表与索引在同一次调用中读取，表被重新加载后两者一致
+    character_table = get_memory("character_table")
+    buckets = get_index("charsByProfessionRarity")
+    char_positions = get_index("charPositions")
+    candidates = {
+        char_id: pos
+        for profession in recruit_ticket_details["professionList"]
+        for rarity in recruit_ticket_details["rarityList"]
+        for pos, char_id in buckets.get((profession, rarity), ())
+    }
+    for char_id in recruit_ticket_details["extraCharIds"]:
+        if "char" in char_id and char_id in char_positions:
+            candidates[char_id] = char_positions[char_id]
+
+    user_chars_by_id = {}
+    for userCharNum in user_data:
+        user_chars_by_id.setdefault(user_data[userCharNum]["charId"], user_data[userCharNum])
+
+    for characterKey in sorted(candidates, key=candidates.get):
+        character = character_table[characterKey]
+
+        userChar = user_chars_by_id.get(characterKey)
 
         if character["profession"] in rlv2_temp_buff["autoUpgrade"]:
 
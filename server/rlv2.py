@@ -9,11 +9,11 @@ from constants import (
     RLV2_USER_SETTINGS_PATH,
     USER_JSON_PATH,
     RL_TABLE_PATH,
-    CONFIG_PATH,
     RLV2_SETTINGS_PATH
 )
 
 from utils import read_json, write_json, decrypt_battle_data, get_memory
+from configstore import config_store
 
 
 def rlv2GiveUpGame():
@@ -308,8 +308,7 @@ def rlv2CreateGame():
     }
     write_json(rlv2, RLV2_JSON_PATH)
 
-    config = read_json(CONFIG_PATH)
-    if config["rlv2Config"]["allChars"]:
+    if config_store.rlv2_all_chars():
         match theme:
             case "rogue_1":
                 ticket = "rogue_1_recruit_ticket_all"
@@ -435,8 +434,7 @@ def getNextTicketIndex(rlv2):
     d = set()
     for e in rlv2["inventory"]["recruit"]:
         d.add(int(e[2:]))
-    config = read_json(CONFIG_PATH)
-    if not config["rlv2Config"]["allChars"]:
+    if not config_store.rlv2_all_chars():
         i = 0
     else:
         i = 10000 - 1
@@ -449,8 +447,7 @@ def rlv2ChooseInitialRecruitSet():
     rlv2 = read_json(RLV2_JSON_PATH)
     rlv2["player"]["pending"].pop(0)
 
-    config = read_json(CONFIG_PATH)
-    if not config["rlv2Config"]["allChars"]:
+    if not config_store.rlv2_all_chars():
         for i in range(3):
             ticket_id = getNextTicketIndex(rlv2)
             addTicket(rlv2, ticket_id)
@@ -522,8 +519,7 @@ def rlv2ActiveRecruitTicket():
 
 
 def getNextCharId(rlv2):
-    config = read_json(CONFIG_PATH)
-    if not config["rlv2Config"]["allChars"]:
+    if not config_store.rlv2_all_chars():
         i = 1
     else:
         i = 10000
@@ -0,0 +1,241 @@
+import os
+import sys
+import struct
+import hashlib
+import tempfile
+import threading
+
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from msgspec import msgpack, DecodeError
+from msgspec.json import Decoder
+
+json_decoder = Decoder(strict=False)
+msgpack_encoder = msgpack.Encoder()
+msgpack_decoder = msgpack.Decoder()
+
+CACHE_SUFFIX = ".msgpack"
+# 缓存文件格式: 4字节头部长度 + msgpack头部 + msgpack数据
+_HEADER_LEN = struct.Struct("<I")
+
+
+def cache_path(path: str) -> str:
+    '''data/excel/xxx.json -> data/excel/xxx.msgpack'''
+    return os.path.splitext(path)[0] + CACHE_SUFFIX
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def _read_header(f) -> Optional[Dict[str, Any]]:
+    raw = f.read(_HEADER_LEN.size)
+    if len(raw) != _HEADER_LEN.size:
+        return None
+    (length,) = _HEADER_LEN.unpack(raw)
+    try:
+        return msgpack_decoder.decode(f.read(length))
+    except DecodeError:
+        return None
+
+
+def write_cache(path: str, data: Any, source_hash: Optional[str] = None):
+    '''
+    为 JSON 表生成二进制缓存
+
+    :param path: JSON 文件路径
+    :param data: 解析后的数据
+    :param source_hash: JSON 文件的哈希，为空时重新计算
+    '''
+    st = os.stat(path)
+    header = msgpack_encoder.encode({
+        "size": st.st_size,
+        "mtime": st.st_mtime_ns,
+        "hash": source_hash or file_hash(path)
+    })
+    target = cache_path(path)
+    # 每次写入使用不同的临时文件，多个线程或进程同时生成同一个缓存时互不影响，读取方也不会读到写了一半的缓存
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(target)}.", suffix=".tmp", dir=os.path.dirname(target))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER_LEN.pack(len(header)))
+            f.write(header)
+            f.write(msgpack_encoder.encode(data))
+        os.replace(tmp_path, target)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def read_cache(path: str) -> Tuple[Optional[Any], Optional[str]]:
+    '''
+    读取缓存，源文件的大小和哈希与缓存记录一致时才视为有效
+
+    :return: (数据, 源文件哈希)，缓存无效时数据为 None
+    '''
+    target = cache_path(path)
+    if not os.path.exists(target):
+        return None, None
+    st = os.stat(path)
+    with open(target, "rb") as f:
+        header = _read_header(f)
+        if header is None or header.get("size") != st.st_size:
+            return None, None
+        source_hash = None
+        # 修改时间不一致时（如重新下载了相同内容）再比对哈希
+        if header.get("mtime") != st.st_mtime_ns:
+            source_hash = file_hash(path)
+            if source_hash != header.get("hash"):
+                return None, source_hash
+        try:
+            return msgpack_decoder.decode(f.read()), header.get("hash")
+        except DecodeError:
+            return None, source_hash
+
+
+_path_locks: Dict[str, threading.Lock] = {}
+_path_locks_lock = threading.Lock()
+
+
+def _path_lock(path: str) -> threading.Lock:
+    key = os.path.normpath(path)
+    with _path_locks_lock:
+        lock = _path_locks.get(key)
+        if lock is None:
+            lock = _path_locks[key] = threading.Lock()
+        return lock
+
+
+def load_table(path: str, use_cache: bool = True) -> Tuple[Any, bool]:
+    '''
+    读取表数据，优先使用二进制缓存，缓存失效时解析 JSON 并重新生成缓存
+
+    :param path: JSON 文件路径
+    :param use_cache: 是否使用缓存
+    :return: (数据, 是否命中缓存)
+    '''
+    if not use_cache:
+        with open(path, "rb") as f:
+            return json_decoder.decode(f.read()), False
+
+    data, source_hash = read_cache(path)
+    if data is not None:
+        return data, True
+
+    # 同一个表同时未命中时只由一个线程解析 JSON 并生成缓存，其他线程等待后直接读取新的缓存
+    with _path_lock(path):
+        data, source_hash = read_cache(path)
+        if data is not None:
+            return data, True
+        with open(path, "rb") as f:
+            data = json_decoder.decode(f.read())
+        try:
+            write_cache(path, data, source_hash)
+        except OSError as e:
+            print(f"写入 {cache_path(path)} 缓存时出错: {str(e)}")
+    return data, False
+
+
+def compile_table(path: str) -> bool:
+    '''确保 path 的缓存有效，供进程池调用（只返回是否命中，避免在进程间传递数据）'''
+    return load_table(path)[1]
+
+
+def resident_size(data: Any) -> int:
+    '''估算解析后的数据占用的内存（字节），共享的字符串等对象会被重复计算'''
+    size = 0
+    stack = [data]
+    while stack:
+        obj = stack.pop()
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, list):
+            stack.extend(obj)
+    return size
+
+
+class LRUTableCache:
+    '''
+    按内存预算淘汰的表缓存。
+
+    表在第一次访问时加载，总占用超过预算时按最近最少使用的顺序淘汰，固定的表不会被淘汰。
+    每个表的内存占用只在文件变化后重新估算一次。
+    '''
+
+    def __init__(self):
+        self._tables: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        # key -> ((mtime_ns, size), 估算的内存占用)
+        self._known_sizes: Dict[str, Tuple[Tuple[int, int], int]] = {}
+        self._used = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, path: str, budget: int, pinned: Iterable[str] = (), use_cache: bool = True) -> Any:
+        '''
+        获取表数据
+
+        :param key: 表名
+        :param path: JSON 文件路径
+        :param budget: 内存预算（字节）
+        :param pinned: 不会被淘汰的表名
+        :param use_cache: 加载时是否使用二进制缓存
+        '''
+        st = os.stat(path)
+        stat = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            # 文件被修改过的表视为未命中，重新加载
+            if key in self._tables and self._known_sizes[key][0] == stat:
+                self._tables.move_to_end(key)
+                self.hits += 1
+                return self._tables[key]
+            self.misses += 1
+
+        data = load_table(path, use_cache)[0]
+        known = self._known_sizes.get(key)
+        if known is None or known[0] != stat:
+            known = self._known_sizes[key] = (stat, resident_size(data))
+
+        with self._lock:
+            self._used -= self._sizes.pop(key, 0)
+            self._tables[key] = data
+            self._tables.move_to_end(key)
+            self._sizes[key] = known[1]
+            self._used += known[1]
+            self._evict(budget, set(pinned), key)
+        return data
+
+    def _evict(self, budget: int, pinned: set, current: str):
+        for key in list(self._tables):
+            if self._used <= budget:
+                break
+            if key in pinned or key == current:
+                continue
+            del self._tables[key]
+            self._used -= self._sizes.pop(key)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+            self._sizes.clear()
+            self._used = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "usedBytes": self._used,
+                "tables": list(self._tables)
+            }
@@ -0,0 +1,213 @@
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from hashlib import md5
+from importlib import import_module
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple, Union
+
+from configstore import config_store
+from utils import get_memory, table_version, json_encoder
+
+# 索引名 -> (依赖的表, 依赖的配置, 构建函数)
+_registry: Dict[str, Tuple[Tuple[str, ...], Union[bool, str], Callable[..., Any]]] = {}
+# 索引名 -> (构建时的版本, 索引)
+_cache: Dict[str, Tuple[tuple, Any]] = {}
+# 配置项 -> (配置版本, 配置项内容的哈希)
+_section_hashes: Dict[str, Tuple[int, str]] = {}
+_lock = threading.Lock()
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def register_index(name: str, *tables: str, uses_config: Union[bool, str] = False):
+    '''
+    注册一个由表数据派生的索引，首次使用时构建，依赖的表文件或配置变化后自动重建
+
+    用法::
+
+        @register_index("campStageIds", "stage_table")
+        def _camp_stage_ids(stage_table):
+            ...
+
+    构建函数按 tables 的顺序接收 get_memory 返回的表，uses_config 为 True 时最后一个参数为完整配置，
+    为配置项名（如"charConfig"）时最后一个参数为该配置项，且只有该配置项的内容变化时才重建。
+    返回的索引是共享对象，写入玩家数据前需要复制。
+    '''
+    def decorator(builder: Callable[..., Any]):
+        _registry[name] = (tables, uses_config, builder)
+        return builder
+    return decorator
+
+
+def config_section_hash(section: str) -> str:
+    '''返回配置项内容的哈希，仅在配置重新加载后重新计算'''
+    version = config_store.version
+    cached = _section_hashes.get(section)
+    if cached is None or cached[0] != version:
+        digest = md5(json_encoder.encode(config_store.get()[section])).hexdigest()
+        cached = _section_hashes[section] = (version, digest)
+    return cached[1]
+
+
+def index_version(name: str) -> tuple:
+    '''返回索引当前依赖的版本（表文件版本与配置版本）'''
+    tables, uses_config, _ = _registry[name]
+    version = tuple(table_version(table) for table in tables)
+    if isinstance(uses_config, str):
+        version += (config_section_hash(uses_config),)
+    elif uses_config:
+        version += (config_store.version,)
+    return version
+
+
+def get_index(name: str) -> Any:
+    '''获取索引，依赖的版本未变化时直接返回缓存'''
+    tables, uses_config, builder = _registry[name]
+    version = index_version(name)
+    cached = _cache.get(name)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    args = [get_memory(table) for table in tables]
+    if isinstance(uses_config, str):
+        args.append(config_store.get()[uses_config])
+    elif uses_config:
+        args.append(config_store.get())
+    value = builder(*args)
+    with _lock:
+        _cache[name] = (version, value)
+    return value
+
+
+def _build_in_process(module: str, name: str) -> Any:
+    # 子进程以 spawn 方式启动时注册表为空，需要先导入注册该索引的模块
+    import_module(module)
+    return get_index(name)
+
+
+def _get_thread_pool(workers: int) -> ThreadPoolExecutor:
+    global _thread_pool
+    with _lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(workers, thread_name_prefix="IndexBuilder")
+        return _thread_pool
+
+
+def _get_process_pool(workers: int) -> ProcessPoolExecutor:
+    global _process_pool
+    with _lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(workers)
+        return _process_pool
+
+
+def prefetch_indexes(names: Iterable[str], workers: int = 4, process_threshold: int = 0):
+    '''
+    并行构建已失效的索引，之后的 get_index 直接命中缓存
+
+    :param names: 索引名
+    :param workers: 线程池/进程池的大小，小于等于1时依次构建
+    :param process_threshold: 依赖的表文件总大小（字节）不小于该值时在进程池中构建，为0时只使用线程池。
+                              在进程池中构建的索引需要能够被 pickle（如编码后的 JSON）
+    '''
+    stale = []
+    for name in names:
+        version = index_version(name)
+        cached = _cache.get(name)
+        if cached is None or cached[0] != version:
+            stale.append((name, version))
+    if len(stale) <= 1 or workers <= 1:
+        for name, _ in stale:
+            get_index(name)
+        return
+
+    futures = {}
+    for name, version in stale:
+        tables, _, builder = _registry[name]
+        if process_threshold > 0 and sum(table_version(table)[1] for table in tables) >= process_threshold:
+            future = _get_process_pool(workers).submit(_build_in_process, builder.__module__, name)
+        else:
+            future = _get_thread_pool(workers).submit(get_index, name)
+        futures[future] = (name, version)
+
+    for future in as_completed(futures):
+        name, version = futures[future]
+        try:
+            value = future.result()
+        except Exception as e:
+            # 进程池不可用时退回到当前线程构建
+            print(f"并行构建索引 {name} 时出错: {str(e)}")
+            get_index(name)
+            continue
+        with _lock:
+            _cache[name] = (version, value)
+
+
+def clear_indexes():
+    with _lock:
+        _cache.clear()
+
+
+@register_index("campStageIds", "stage_table")
+def _camp_stage_ids(stage_table):
+    # 剿灭作战关卡
+    return [stage for stage in stage_table["stages"] if stage.startswith("camp")]
+
+
+@register_index("charSkins", "skin_table")
+def _char_skins(skin_table):
+    # (全部时装 -> 1, 角色 -> 该角色最后一个时装)
+    character_skins = {}
+    skin_by_char = {}
+    for skin_id, skin_data in skin_table["charSkins"].items():
+        if "@" not in skin_id:
+            continue
+        character_skins[skin_id] = 1
+        skin_by_char[skin_data["charId"]] = skin_id
+    return character_skins, skin_by_char
+
+
+@register_index("charEquip", "uniequip_table")
+def _char_equip(equip_table):
+    # 角色 -> (满级模组字典, 默认装备的模组)
+    equip_dict = equip_table["equipDict"]
+    result = {}
+    for char_id, equip_list in equip_table["charEquip"].items():
+        if not equip_list:
+            continue
+        result[char_id] = ({
+            equip: {
+                "hide": 0,
+                "locked": 0,
+                "level": (
+                    len(equip_dict[equip]["itemCost"])
+                    if equip_dict[equip].get("itemCost") is not None
+                    else 1
+                )
+            } for equip in equip_list
+        }, equip_list[-1])
+    return result
+
+
+@register_index("charsByProfessionRarity", "character_table")
+def _chars_by_profession_rarity(character_table):
+    # (职业, 稀有度) -> [(在表中的顺序, 角色)]
+    buckets = {}
+    for pos, (char_id, char_data) in enumerate(character_table.items()):
+        if "char" not in char_id:
+            continue
+        buckets.setdefault((char_data["profession"], char_data["rarity"]), []).append((pos, char_id))
+    return buckets
+
+
+@register_index("charPositions", "character_table")
+def _char_positions(character_table):
+    return {char_id: pos for pos, char_id in enumerate(character_table)}
+
+
+@register_index("gachaPoolNames", "gacha_table")
+def _gacha_pool_names(gacha_table):
+    names = {}
+    for item in gacha_table["gachaPoolClient"]:
+        names.setdefault(item.get("gachaPoolId"), item.get("gachaPoolName", ""))
+    return names
@@ -5,33 +5,79 @@ import threading
 import traceback
 import sys
 import os
+from time import perf_counter
 
 from msgspec.json import Encoder, Decoder, format
 from typing import Optional
 from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from datetime import datetime
 from hashlib import sha3_512
 from random import shuffle
-from flask import after_this_request
+from flask import after_this_request, g, has_request_context
 from datetime import datetime, UTC
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import unpad
 
-from constants import USER_JSON_PATH, SERVER_DATA_PATH, SYNC_DATA_TEMPLATE_PATH, CONFIG_PATH
+from constants import USER_JSON_PATH, SERVER_DATA_PATH, SYNC_DATA_TEMPLATE_PATH, CONFIG_PATH, \
+    RLV2_JSON_PATH, TOWERDATA_PATH, BATTLE_REPLAY_JSON_PATH
+from playerstore import PlayerStore
+from configstore import config_store
+from tablecache import load_table, compile_table, resident_size, LRUTableCache
+from metrics import metrics, READS, WRITES
 
 json_encoder = Encoder()  # 移除 order="deterministic" 参数
 json_decoder = Decoder(strict=False)
 
-def read_json(path: str, encoding: Optional[str] = None) -> Dict[str, Any]:
+def read_json_file(path: str) -> Dict[str, Any]:
     with open(path, "rb") as f:
-        return json_decoder.decode(f.read())
+        raw = f.read()
+    metrics.record_io(READS, 0, len(raw))
+    return json_decoder.decode(raw)
 
-def write_json(data: Any, path: str, indent: int = 4, encoding: Optional[str] = None):
+def write_json_file(data: Any, path: str, indent: int = 4):
+    raw = json_encoder.encode(data)
+    if indent:
+        raw = format(raw, indent=indent)
     with open(path, "wb") as f:
-        if indent:
-            f.write(format(json_encoder.encode(data), indent=indent))
-        else:
-            f.write(json_encoder.encode(data))
+        f.write(raw)
+    metrics.record_io(WRITES, 0, len(raw))
+
+# 玩家数据常驻内存，由 app.py 根据配置启用，未启用时 read_json/write_json 直接读写文件
+player_store = PlayerStore(
+    read_json_file,
+    write_json_file,
+    (USER_JSON_PATH, RLV2_JSON_PATH, TOWERDATA_PATH, BATTLE_REPLAY_JSON_PATH)
+)
+
+# 每次 write_json 递增，用于判断玩家数据自上次读取后是否被修改过
+data_version = 0
+_data_version_lock = threading.Lock()
+
+def get_data_version() -> int:
+    return data_version
+
+def bump_data_version():
+    '''递增数据版本，并记录当前请求自身的写入次数'''
+    global data_version
+    with _data_version_lock:
+        data_version += 1
+    if has_request_context():
+        g.data_writes = g.get("data_writes", 0) + 1
+
+def read_json(path: str, encoding: Optional[str] = None) -> Dict[str, Any]:
+    metrics.record_io(READS)
+    if player_store.manages(path):
+        return player_store.get(path)
+    return read_json_file(path)
+
+def write_json(data: Any, path: str, indent: int = 4, encoding: Optional[str] = None):
+    bump_data_version()
+    metrics.record_io(WRITES)
+    if player_store.manages(path):
+        player_store.put(path, data)
+        return
+    write_json_file(data, path, indent)
 
 def decrypt_battle_data(data: str, login_time: int = read_json(USER_JSON_PATH)["user"]["pushFlags"]["status"]):
     
@@ -92,6 +138,24 @@ def run_after_response(func, *args, on_error=None):
     
 #定义一个全局变量，用于存储从 JSON 文件中读取的数据
 memory_cache: Dict[str, Any] = {}
+# 预加载统计信息，key 为表名
+table_stats: Dict[str, Dict[str, Any]] = {}
+# 预加载失败的文件及原因
+preload_failures: Dict[str, str] = {}
+# 关闭 useMemoryCache 且设置了 tableCacheBudget 时使用的按需缓存
+table_lru = LRUTableCache()
+
+def _load_table_file(key: str, file_path: str, use_cache: bool, measure_size: bool):
+    start = perf_counter()
+    data, hit = load_table(file_path, use_cache)
+    stats = {
+        "decodeTime": perf_counter() - start,
+        "fileSize": os.path.getsize(file_path),
+        "residentSize": resident_size(data) if measure_size else None,
+        "cached": hit
+    }
+    return key, data, stats
+
 # 读取 JSON 文件并存入内存
 def preload_json_data():
     # 加载 data/excel 目录下的所有 JSON 文件到内存中
@@ -102,17 +166,64 @@ def preload_json_data():
     if not os.path.exists(excel_dir):
         raise FileNotFoundError(f"未找到目录: {excel_dir}")
     
-    # 遍历目录下的所有 JSON 文件
-    for filename in os.listdir(excel_dir):
-        if filename.endswith(".json"):
-            # 去除 .json 后缀作为 key
-            key = filename[:-5]
-            file_path = os.path.join(excel_dir, filename)
-            
+    server_config = config_store.server()
+    use_cache = server_config.get("useTableCache", True)
+    workers = max(int(server_config.get("preloadWorkers", os.cpu_count() or 1)), 1)
+    report = server_config.get("preloadReport", False)
+    start = perf_counter()
+
+    # 遍历目录下的所有 JSON 文件，去除 .json 后缀作为 key
+    files = {
+        filename[:-5]: os.path.join(excel_dir, filename)
+        for filename in os.listdir(excel_dir) if filename.endswith(".json")
+    }
+
+    # 解析 JSON 时无法释放 GIL，开启多进程时先在子进程中并行重建失效的缓存，主进程只需读取二进制缓存
+    if use_cache and workers > 1 and server_config.get("preloadProcesses", False):
+        with ProcessPoolExecutor(workers) as pool:
+            futures = {pool.submit(compile_table, path): key for key, path in files.items()}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception:
+                    pass  # 下面读取时会再次报告
+
+    preload_failures.clear()
+    with ThreadPoolExecutor(workers) as pool:
+        futures = {
+            pool.submit(_load_table_file, key, path, use_cache, report): key
+            for key, path in files.items()
+        }
+        for future in as_completed(futures):
             try:
-                memory_cache[key] = read_json(file_path)
+                key, data, stats = future.result()
             except Exception as e:
-                print(f"加载 {filename} 时出错: {str(e)}")
+                preload_failures[futures[future]] = str(e)
+                print(f"加载 {futures[future]}.json 时出错: {str(e)}")
+                continue
+            memory_cache[key] = data
+            table_stats[key] = stats
+
+    elapsed = perf_counter() - start
+    cache_hits = sum(table_stats[key]["cached"] for key in files if key in table_stats)
+    print(f"已加载 {len(files) - len(preload_failures)} 个表（{cache_hits} 个来自二进制缓存，{len(preload_failures)} 个失败），"
+          f"线程数 {workers}，耗时 {elapsed:.3f}s")
+    if report:
+        print(format_table_stats())
+
+def format_table_stats() -> str:
+    '''按解析耗时从高到低输出预加载统计表'''
+    lines = [f"{'table':<40}{'file(MB)':>10}{'mem(MB)':>10}{'time(s)':>10}{'cache':>7}"]
+    for key, stats in sorted(table_stats.items(), key=lambda item: item[1]["decodeTime"], reverse=True):
+        resident = stats["residentSize"]
+        lines.append(
+            f"{key:<40}{stats['fileSize'] / 1048576:>10.2f}"
+            f"{(resident / 1048576 if resident is not None else float('nan')):>10.2f}"
+            f"{stats['decodeTime']:>10.3f}{'yes' if stats['cached'] else 'no':>7}"
+        )
+    for key, error in preload_failures.items():
+        lines.append(f"{key:<40} 加载失败: {error}")
+    return "\n".join(lines)
 
 global_loop: Optional[asyncio.AbstractEventLoop] = None
 def start_global_event_loop() -> asyncio.AbstractEventLoop:
@@ -132,14 +243,26 @@ def start_global_event_loop() -> asyncio.AbstractEventLoop:
     global_loop = loop
     return loop
 
+def table_version(key: str) -> tuple:
+    '''
+    返回表文件的版本，文件被替换或修改后版本随之变化，供由表派生的缓存判断是否失效
+
+    :param key: 表名，如"character_table"
+    '''
+    file_path = f"data/excel/{key}.json"
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
+        raise KeyError(f"未找到文件: {file_path}")
+    return st.st_mtime_ns, st.st_size
+
 def get_memory(key: str) -> dict:
     '''
     从内存缓存中获取数据
 
     :param key: 要获取的数据的名，如"activity_table"，返回"data/excel/activity_table.json"中的数据
     '''
-    useMemoryCache = read_json(CONFIG_PATH)["server"]["useMemoryCache"]
-    if useMemoryCache:
+    if config_store.use_memory_cache():
         # 从内存缓存中获取数据，如果不存在则尝试读取文件
         try:
             return memory_cache[key]
@@ -148,18 +271,34 @@ def get_memory(key: str) -> dict:
             file_path = f"data/excel/{key}.json"
             try:
                 # 将加载的数据存入缓存以备后续使用
-                data = read_json(file_path)
+                data = load_table(file_path, config_store.server().get("useTableCache", True))[0]
                 memory_cache[key] = data
                 return data
             except FileNotFoundError:
                 raise KeyError(f"未找到文件: {file_path}")
             except Exception as e:
                 raise ValueError(f"加载 {file_path} 时出错: {str(e)}")
+    # 按需加载，按内存预算淘汰不常用的表
+    elif config_store.server().get("tableCacheBudget", 0) > 0:
+        server_config = config_store.server()
+        file_path = f"data/excel/{key}.json"
+        try:
+            return table_lru.get(
+                key,
+                file_path,
+                server_config["tableCacheBudget"] * 1048576,
+                server_config.get("pinnedTables", ()),
+                server_config.get("useTableCache", True)
+            )
+        except FileNotFoundError:
+            raise KeyError(f"未找到文件: {file_path}")
+        except Exception as e:
+            raise ValueError(f"加载 {file_path} 时出错: {str(e)}")
     # 如果不使用内存缓存，则直接从文件中读取数据
     else:
         file_path = f"data/excel/{key}.json"
         try:
-            return read_json(file_path)
+            return load_table(file_path, config_store.server().get("useTableCache", True))[0]
         except FileNotFoundError:
             raise KeyError(f"未找到文件: {file_path}")
         except Exception as e:
@@ -1,36 +1,66 @@
-from constants import CONFIG_PATH
-from utils import read_json
+from configstore import config_store
 from time import time as real_time
 from datetime import datetime
+from typing import Optional, Tuple
 
-def time():
-    config_data = read_json(CONFIG_PATH)
-    virtual_time = config_data["server"]["virtualtime"]
-    
+from flask import g, has_request_context
+
+# 兼容的时间格式列表
+TIME_FORMATS = [
+    "%Y/%m/%d %H:%M:%S",
+    "%d%m%Y %H:%M:%S",
+    "%d-%m-%Y %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y%m%d %H:%M:%S",
+]
+
+# (配置版本, 固定时间戳)，固定时间戳为 None 时使用真实时间
+_clock: Optional[Tuple[int, Optional[int]]] = None
+
+
+def parse_virtual_time(virtual_time) -> Optional[int]:
+    '''
+    解析配置中的 virtualtime
+
+    :return: 固定的时间戳；返回 None 表示使用真实时间
+    '''
     if isinstance(virtual_time, str):
-        # 兼容的时间格式列表
-        time_formats = [
-            "%Y/%m/%d %H:%M:%S",
-            "%d%m%Y %H:%M:%S",
-            "%d-%m-%Y %H:%M:%S",
-            "%Y-%m-%d %H:%M:%S",
-            "%Y%m%d %H:%M:%S",
-        ]
-        
-        for fmt in time_formats:
+        for fmt in TIME_FORMATS:
             try:
-                dt = datetime.strptime(virtual_time, fmt)
-                return int(dt.timestamp())
+                return int(datetime.strptime(virtual_time, fmt).timestamp())
             except ValueError:
                 continue
-        
+
         # 如果所有格式都不匹配，返回真实时间戳（防刁民措施）
-        return int(real_time())
-    
-    elif isinstance(virtual_time, int):
+        return None
+
+    elif isinstance(virtual_time, int) and not isinstance(virtual_time, bool):
         if virtual_time < 0:
-            return int(real_time())
-        return int(virtual_time)
-    
+            return None
+        return virtual_time
+
     # 如果 virtualtime 类型不是 str 或 int，返回真实时间戳（防刁民措施）
-    return int(real_time())
\ No newline at end of file
+    return None
+
+
+def now() -> int:
+    '''不经过请求缓存，直接返回当前的虚拟时间'''
+    global _clock
+    version = config_store.version
+    if _clock is None or _clock[0] != version:
+        # 仅在配置重新加载后重新解析
+        _clock = (version, parse_virtual_time(config_store.virtual_time()))
+    fixed = _clock[1]
+    return int(real_time()) if fixed is None else fixed
+
+
+def time() -> int:
+    '''
+    返回虚拟时间。同一个请求内只计算一次，保证一次响应中的所有时间戳一致
+    '''
+    if not has_request_context():
+        return now()
+    ts = g.get("virtual_time")
+    if ts is None:
+        ts = g.virtual_time = now()
+    return ts
@@ -0,0 +1,19 @@
+# WSGI 入口，供 gunicorn 等多进程服务器使用:
+#   gunicorn -c server/gunicorn.conf.py wsgi:app
+# 需要在仓库根目录下运行（数据文件使用相对路径）
+import gc
+
+from app import app, load_tables, server_config
+
+# 在主进程中加载，工作进程 fork 后共享已加载的表。
+# 开启 preloadInMaster 时不论 useMemoryCache 如何都加载全部表并使用内存缓存，否则工作进程仍会各自读取表。
+# 加载期间关闭垃圾回收，加载后冻结全部对象：之后的回收不再遍历（写入）这些对象的头部，
+# 表所在的内存页才能一直保持写时复制的共享状态
+preload = server_config["server"].get("preloadInMaster", True)
+if server_config["server"].get("gcFreeze", True):
+    gc.disable()
+    load_tables(preload)
+    gc.freeze()
+    gc.enable()
+else:
+    load_tables(preload)
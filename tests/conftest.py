@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+# 服务端模块以 server 目录为根导入
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "server"))
+
+# 服务端使用相对于仓库根目录的数据路径（如 data/user/user.json）
+os.chdir(Path(__file__).resolve().parent.parent)
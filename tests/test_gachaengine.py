@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from gachaengine import AliasTable, CompiledPool, six_star_bonus
+
+
+def pool_json(up_chars=()):
+    return {
+        "detailInfo": {
+            "availCharInfo": {
+                "perAvailList": [
+                    {"rarityRank": 5, "totalPercent": 0.02, "charIdList": ["six_a", "six_b", "six_up"]},
+                    {"rarityRank": 4, "totalPercent": 0.08, "charIdList": ["five_a", "five_up"]},
+                    {"rarityRank": 3, "totalPercent": 0.9, "charIdList": ["four_a"]},
+                ]
+            },
+            "upCharInfo": {"perCharList": list(up_chars)}
+        }
+    }
+
+
+UP_CHARS = [
+    {"rarityRank": 5, "percent": 0.5, "charIdList": ["six_up"]},
+    {"rarityRank": 4, "percent": 0.25, "charIdList": ["five_up"]},
+]
+
+
+@pytest.mark.parametrize("weights", [[1, 1, 1, 1], [5, 1, 0, 3, 11], [1, 998, 1], [7]])
+def test_alias_table_frequencies(weights):
+    rng = random.Random(1234)
+    table = AliasTable(list(range(len(weights))), weights)
+    draws = 200000
+    counts = [0] * len(weights)
+    for _ in range(draws):
+        counts[table.sample(rng)] += 1
+    total = sum(weights)
+    for i, weight in enumerate(weights):
+        if weight == 0:
+            assert counts[i] == 0
+        else:
+            assert counts[i] / draws == pytest.approx(weight / total, abs=0.005)
+
+
+def test_alias_table_rejects_empty_weights():
+    with pytest.raises(ValueError):
+        AliasTable([], [])
+    with pytest.raises(ValueError):
+        AliasTable(["a"], [0])
+
+
+def test_pool_weights_with_up():
+    pool = CompiledPool(pool_json(UP_CHARS), 200, True, False)
+    assert pool.ranks == [(5, 0, 4), (4, 1, 16), (3, 2, 180)]
+    # 每个角色权重为1，UP 角色额外增加 percent * 100 - 15
+    assert dict(zip(pool.char_tables[0].items, pool.char_tables[0].weights)) == {"six_a": 1, "six_b": 1, "six_up": 36}
+    assert dict(zip(pool.char_tables[1].items, pool.char_tables[1].weights)) == {"five_a": 1, "five_up": 11}
+    assert pool.char_tables[2].weights == [1]
+
+
+def test_pool_weights_without_up():
+    pool = CompiledPool(pool_json(UP_CHARS), 100, False, False)
+    assert pool.ranks == [(5, 0, 2), (4, 1, 8), (3, 2, 90)]
+    assert pool.char_tables[0].weights == [1, 1, 1]
+
+
+def test_six_star_only():
+    pool = CompiledPool(pool_json(UP_CHARS), 200, True, True)
+    assert pool.ranks == [(5, 0, 4)]
+    assert list(pool.char_tables) == [0]
+    rng = random.Random(0)
+    assert all(pool.draw(0, rng)[0] == 5 for _ in range(100))
+
+
+def test_rank_table_six_star_bonus():
+    pool = CompiledPool(pool_json(), 200, True, False)
+    assert pool.rank_table(0).weights == [4, 16, 180]
+    assert pool.rank_table(six_star_bonus(50)).weights == [8, 16, 180]
+    # 相同的保底权重只构建一次
+    assert pool.rank_table(4) is pool.rank_table(4)
@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from gachahistory import GachaHistoryStore, PoolHistory
+
+
+def random_pulls(rng, count):
+    '''按时间顺序生成 count 次寻访，每次 1 或 10 抽，时间戳集中在小范围内以产生相同的时间差'''
+    pulls = []
+    ts = 1000
+    for _ in range(count):
+        ts += rng.choice((0, 1, 5, 50))
+        pulls.append([{"gachaTs": str(ts), "pos": pos, "charId": f"char_{rng.randrange(100)}"}
+                      for pos in range(rng.choice((1, 10)))])
+    return pulls
+
+
+def old_page(pulls, ts, offset, size):
+    '''旧版 gacha.Gacha 保存记录（新的插入到最前面，相同的 gachaTs 与 pos 覆盖）与 gacha.history 的排序方式'''
+    stored = []
+    for records in pulls:
+        index_map = {(item["gachaTs"], item["pos"]): i for i, item in enumerate(stored)}
+        inserted = []
+        for record in records:
+            key = (record["gachaTs"], record["pos"])
+            if key in index_map:
+                stored[index_map[key]] = record
+            else:
+                inserted.append(record)
+        stored[:0] = reversed(inserted)
+    stored.sort(key=lambda x: (abs(int(x["gachaTs"]) - ts), -x["pos"]))
+    return stored[offset:offset + size], len(stored) > offset + size
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_page_matches_old_sort(seed):
+    rng = random.Random(seed)
+    pulls = random_pulls(rng, rng.randrange(1, 30))
+    history = PoolHistory()
+    for records in pulls:
+        for record in records:
+            history.add(record)
+
+    last_ts = int(pulls[-1][0]["gachaTs"])
+    for _ in range(20):
+        ts = rng.randrange(950, last_ts + 50)
+        offset = rng.randrange(0, 40)
+        assert history.page(ts, offset, 10) == old_page(pulls, ts, offset, 10)
+
+
+def test_equal_distance_prefers_newer():
+    history = PoolHistory()
+    older = {"gachaTs": "950", "pos": 0}
+    newer = {"gachaTs": "1050", "pos": 0}
+    history.add(older)
+    history.add(newer)
+    assert history.page(1000, 0, 10) == ([newer, older], False)
+
+
+def test_store_replays_journal(tmp_path):
+    path = str(tmp_path / "gachaHistory.json")
+    pulls = random_pulls(random.Random(0), 12)
+    store = GachaHistoryStore(path)
+    store.checkpoint_interval = 5
+    for records in pulls:
+        store.append("pool", records)
+
+    # 新的实例从快照与日志重新加载
+    reloaded = GachaHistoryStore(path)
+    reloaded.checkpoint_interval = 0
+    for ts in (1000, 1100, 1300):
+        assert reloaded.page("pool", ts, 0, 10) == old_page(pulls, ts, 0, 10)
+    assert reloaded.page("missing", 1000) == ([], False)
@@ -0,0 +1,58 @@
+import copy
+
+import pytest
+
+from journal import Journal, apply, diff, flatten
+
+
+def replay(tmp_path, old, new):
+    '''把 old -> new 的差异写入日志，再重放到 old 的副本上'''
+    journal = Journal(str(tmp_path / "user.json"))
+    journal.append(diff(flatten(old), flatten(new)))
+    return journal.replay(copy.deepcopy(old))
+
+
+CASES = [
+    # 删除整个嵌套对象
+    (
+        {"user": {"consumable": {"EXP": {"0": {"ts": -1, "count": 1}}, "AP": {"0": {"count": 2}}}}},
+        {"user": {"consumable": {"AP": {"0": {"count": 2}}}}},
+    ),
+    # 删除超过展开深度的子树
+    (
+        {"user": {"rlv2": {"current": {"player": {"state": "INIT", "property": {"hp": 1}}}, "outer": {}}}},
+        {"user": {"rlv2": {"outer": {}}}},
+    ),
+    # 对象变为空对象
+    (
+        {"user": {"troop": {"chars": {"1": {"charId": "a"}, "2": {"charId": "b"}}}}},
+        {"user": {"troop": {"chars": {}}}},
+    ),
+    # 空对象变为有子节点
+    (
+        {"user": {"troop": {"chars": {}}}},
+        {"user": {"troop": {"chars": {"1": {"charId": "a"}}}}},
+    ),
+    # 对象与值互相替换
+    (
+        {"user": {"a": {"b": {"c": 1}}, "d": 1}},
+        {"user": {"a": 2, "d": {"e": [1, 2]}}},
+    ),
+    # 删除顶层键
+    (
+        {"user": {"a": 1}, "extra": {"b": {"c": {"d": {"e": 1}}}}},
+        {"user": {"a": 1}},
+    ),
+]
+
+
+@pytest.mark.parametrize("old, new", CASES)
+def test_replay_round_trip(tmp_path, old, new):
+    assert replay(tmp_path, old, new) == new
+
+
+def test_removed_subtree_is_one_delete():
+    old = {"user": {"consumable": {"EXP": {"0": {"ts": -1}, "1": {"ts": -1}}}}}
+    new = {"user": {"consumable": {}}}
+    ops = diff(flatten(old), flatten(new))
+    assert [op for op in ops if op[0] == "del"] == [["del", ["user", "consumable", "EXP"]]]